@@ -1,53 +1,116 @@
 import asyncio
+import hmac
 import json
 import re
+import time
+from contextlib import aclosing, suppress
+from datetime import datetime
 from typing import AsyncGenerator
 
-from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 from fastapi.responses import JSONResponse, StreamingResponse
-from fastapi_limiter.depends import RateLimiter
+from sqlalchemy.dialects.postgresql import insert
 
-from .aws_service import S3Service
+from .card_writer import build_card_record
 from .config import settings
-from .db import get_session
-from .dependencies import get_redis_pubsub_client
+from .db import get_async_session
+from .dependencies import celery_app
 from .exceptions import ImageFormatError
 from .logging_config import logger
-from .models import Card
-from .tasks import generate_superhero_card
+from .metrics import (
+    result_cache_requests,
+    sse_active_streams,
+    sse_events_delivered,
+    stage_duration,
+    websocket_active_streams,
+    websocket_events_delivered,
+)
+from .models import Card, CardTheme
+from .prefilter import HOLIDAY_RULES, SUPERHERO_RULES, Verdict, prefilter
+from .profiling import is_profile_requested, profile_async, should_profile
+from .rate_limit import limit_card_submissions
+from .result_cache import forget_result, result_cache_key, reuse_result
+from .streaming import card_events, to_sse
 from .utils import compress_image, validate_image_format
 
 router = APIRouter()
 
+STREAM_TIMEOUT = 300  # 5 minutes max
 
-@router.post("/generate-hero-card", dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+
+@router.post("/generate-hero-card", dependencies=[Depends(limit_card_submissions)])
 async def generate_hero_card(
     text: str = Form(...),
     image: UploadFile = File(...),
     session_id: str = Form(...),
     holiday_theme: bool = Form(False),
+    x_profile: str | None = Header(None),
 ) -> JSONResponse:
-    image_data = await image.read()
+    preprocess_started_at = time.perf_counter()
+    profile_requested = is_profile_requested(x_profile)
 
-    try:
-        validate_image_format(image_data)
-    except ImageFormatError as error:
-        logger.warning(f"Image format validation failed for session {session_id}: {error}")
-        return JSONResponse(status_code=400, content={"error": str(error)})
+    # Decode straight from the spooled upload file rather than reading the whole upload into memory
+    async with profile_async(session_id=session_id, name="upload", enabled=should_profile(profile_requested)):
+        try:
+            validate_image_format(image.file)
+        except ImageFormatError as error:
+            logger.warning(f"Image format validation failed for session {session_id}: {error}")
+            return JSONResponse(status_code=400, content={"error": str(error)})
 
-    try:
-        compressed_image_data = compress_image(image_data, max_size_bytes=1024 * 1024)
-    except Exception as error:
-        logger.error(f"Image compression failed for session {session_id}: {error}")
-        return JSONResponse(status_code=500, content={"error": "Failed to process image"})
+        try:
+            compressed_image_data = compress_image(image.file, max_size_bytes=1024 * 1024)
+        except Exception as error:
+            logger.error(f"Image compression failed for session {session_id}: {error}")
+            return JSONResponse(status_code=500, content={"error": "Failed to process image"})
+    stage_duration.labels(stage="upload_preprocess").observe(time.perf_counter() - preprocess_started_at)
 
     text = re.sub(r"\s+", " ", text.strip())
 
-    generate_superhero_card.delay(
-        image_data=compressed_image_data,
-        text=text,
-        session_id=session_id,
-        holiday_theme=holiday_theme,
+    # Settle inputs the local pre-filter rejects here, before a worker or any image generation is involved
+    rules = HOLIDAY_RULES if holiday_theme else SUPERHERO_RULES
+    if prefilter(text, rules) == Verdict.REJECT:
+        logger.warning(f"Input rejected by the pre-filter for session {session_id}")
+        return JSONResponse(status_code=400, content={"error": rules.invalid_message})
+
+    result_key = None
+    if settings.result_cache_enabled:
+        result_key = result_cache_key(compressed_image_data, text, holiday_theme)
+        image_base64 = await _serve_cached_card(
+            result_key, session_id=session_id, text=text, holiday_theme=holiday_theme
+        )
+        if image_base64:
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "session_id": session_id,
+                    "image_base64": image_base64,
+                    "message": "Card served from cache",
+                },
+            )
+
+    # Enqueue by name so the web process never imports the task module and the LLM stack behind it
+    celery_app.send_task(
+        "generate_superhero_card",
+        kwargs={
+            "image_data": compressed_image_data,
+            "text": text,
+            "session_id": session_id,
+            "holiday_theme": holiday_theme,
+            "enqueued_at": time.time(),
+            "profile_requested": profile_requested,
+            "result_cache_key": result_key,
+        },
     )
 
     return JSONResponse(
@@ -59,78 +122,65 @@ async def generate_hero_card(
     )
 
 
-def _get_card_from_s3(session_id: str) -> str | None:
+async def _serve_cached_card(result_key: str, session_id: str, text: str, holiday_theme: bool) -> str | None:
+    """Copy the cached card to a new card for ``session_id`` and return it, or None on a miss."""
+    source_key = await reuse_result(result_key)
+    if not source_key:
+        return None
+
+    from .aws_service import S3Service
+
+    theme = CardTheme.HOLIDAY if holiday_theme else CardTheme.SUPERHERO
     try:
-        with get_session() as db_session:
-            card = db_session.query(Card).filter(Card.session_id == session_id).first()
-            if not card or not card.aws_object_key:
-                logger.warning(f"No card or aws_object_key found for session {session_id}")
-                return None
-
-            folder_prefix = settings.s3_holiday_folder_prefix if card.theme == "holiday" else settings.s3_folder_prefix
-            s3_service = S3Service(folder_prefix=folder_prefix)
-
-            image_base64 = s3_service.get_image_base64(card.aws_object_key)
-            logger.debug(f"Retrieved card from S3 for session {session_id}")
-            return image_base64
+        folder_prefix = settings.s3_holiday_folder_prefix if holiday_theme else settings.s3_folder_prefix
+        s3_service = await asyncio.to_thread(S3Service, folder_prefix=folder_prefix)
+        object_key = await asyncio.to_thread(s3_service.copy_image, source_key, session_id)
     except Exception as error:
-        logger.error(f"Error getting card from S3 for session {session_id}: {error}")
+        # The cached card may have been purged by retention; generate a new one instead
+        logger.warning(f"Could not reuse cached card {source_key} for session {session_id}: {error}")
+        result_cache_requests.labels(result="stale").inc()
+        await forget_result(result_key)
         return None
 
-
-def _get_error_from_db(session_id: str) -> str | None:
     try:
-        with get_session() as db_session:
-            card = db_session.query(Card).filter(Card.session_id == session_id).first()
-            if card:
-                return card.error_message if card.error_message else None
-            logger.warning(f"No card found in DB for session {session_id}")
-            return None
+        image_base64 = await asyncio.to_thread(s3_service.get_image_base64, object_key)
+        record = build_card_record(
+            session_id=session_id, text=text, theme=theme, status="complete", aws_object_key=object_key
+        )
+        async with get_async_session() as db_session:
+            await db_session.execute(insert(Card).on_conflict_do_nothing(index_elements=["session_id"]), [record])
     except Exception as error:
-        logger.error(f"Error getting error from db session {session_id}: {error}")
+        # The cache entry is still good; only this copy of it is dropped
+        logger.error(f"Could not serve cached card {source_key} for session {session_id}: {error}")
+        result_cache_requests.labels(result="failed").inc()
+        with suppress(Exception):
+            await asyncio.to_thread(s3_service.delete_object, object_key)
         return None
 
+    result_cache_requests.labels(result="hit").inc()
+    logger.info(f"Served cached card {source_key} for session {session_id}")
+    return image_base64
+
 
 @router.get("/stream/{session_id}")
 async def stream_partial_images(session_id: str) -> StreamingResponse:
     async def event_generator() -> AsyncGenerator[str, None]:
-        redis_client = get_redis_pubsub_client()
-        pubsub = redis_client.pubsub()
-        channel = f"image_stream:{session_id}"
-
+        sse_active_streams.inc()
+        logger.info(f"SSE client connected for session {session_id}")
         try:
-            pubsub.subscribe(channel)
-            logger.info(f"SSE client connected for session {session_id}")
-
-            yield f"data: {json.dumps({'type': 'connected', 'session_id': session_id})}\n\n"
-
-            timeout = 300  # 5 minutes max
-            start_time = asyncio.get_event_loop().time()
-
-            while True:
-                if asyncio.get_event_loop().time() - start_time > timeout:
-                    logger.warning(f"SSE timeout for session {session_id}")
-                    yield f"data: {json.dumps({'type': 'error', 'message': 'Timeout'})}\n\n"
-                    break
-
-                message = pubsub.get_message(timeout=0.1)
-                if message and message["type"] == "message":
-                    data = json.loads(message["data"])
-                    logger.debug(f"Streaming event to client: {data.get('type')}")
-                    yield f"data: {json.dumps(data)}\n\n"
-
-                    if data.get("type") == "complete":
-                        break
-
-                await asyncio.sleep(0.1)
+            async with aclosing(card_events(session_id, timeout=STREAM_TIMEOUT)) as events:
+                async for event, image in events:
+                    yield to_sse(event, image)
 
+                    logger.debug("Streaming event to client: %s", event["type"])
+                    sse_events_delivered.labels(type=event["type"]).inc()
+                    if "published_at" in event:
+                        stage_duration.labels(stage="sse_delivery_lag").observe(time.time() - event["published_at"])
         except Exception as e:
             logger.error(f"Error in SSE stream for session {session_id}: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'message': 'Stream error'})}\n\n"
+            yield to_sse({"type": "error", "message": "Stream error"})
         finally:
-            pubsub.unsubscribe(channel)
-            pubsub.close()
-            redis_client.close()
+            sse_active_streams.dec()
             logger.info(f"SSE client disconnected for session {session_id}")
 
     return StreamingResponse(
@@ -142,3 +192,70 @@ async def stream_partial_images(session_id: str) -> StreamingResponse:
             "X-Accel-Buffering": "no",
         },
     )
+
+
+async def _relay_card_events(websocket: WebSocket, session_id: str) -> None:
+    async with aclosing(card_events(session_id, timeout=STREAM_TIMEOUT)) as events:
+        async for event, image in events:
+            await websocket.send_text(json.dumps(event))
+            if image:
+                await websocket.send_bytes(image)
+
+            websocket_events_delivered.labels(type=event["type"]).inc()
+            if "published_at" in event:
+                stage_duration.labels(stage="websocket_delivery_lag").observe(time.time() - event["published_at"])
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    # Clients send nothing, so reading only tells us when they go away
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@router.websocket("/ws/{session_id}")
+async def stream_partial_images_ws(websocket: WebSocket, session_id: str) -> None:
+    """Same events as the SSE stream, with each card image sent as a binary PNG frame right after its event."""
+    await websocket.accept()
+    websocket_active_streams.inc()
+    logger.info(f"WebSocket client connected for session {session_id}")
+    relay_task = asyncio.create_task(_relay_card_events(websocket, session_id))
+    disconnect_task = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        await asyncio.wait([relay_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+        if relay_task.done():
+            relay_task.result()
+            disconnect_task.cancel()
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in WebSocket stream for session {session_id}: {e}")
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        # Stops the relay and its pub/sub subscription as soon as the client disconnects
+        for task in (relay_task, disconnect_task):
+            task.cancel()
+        await asyncio.gather(relay_task, disconnect_task, return_exceptions=True)
+        websocket_active_streams.dec()
+        logger.info(f"WebSocket client disconnected for session {session_id}")
+
+
+@router.get("/export/cards.zip")
+async def export_cards_zip(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    theme: CardTheme | None = None,
+    x_export_token: str | None = Header(None),
+) -> StreamingResponse:
+    if not settings.export_token or not hmac.compare_digest(x_export_token or "", settings.export_token):
+        raise HTTPException(status_code=404)
+
+    # Imported here so the export's S3 client stays out of web start-up
+    from .export import export_cards
+
+    logger.info(f"Exporting cards since={since} until={until} theme={theme}")
+    return StreamingResponse(
+        export_cards(since=since, until=until, theme=theme),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="cards.zip"'},
+    )
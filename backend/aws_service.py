@@ -7,6 +7,9 @@ from botocore.exceptions import ClientError
 from .config import settings
 from .logging_config import logger
 
+# Maximum number of keys accepted by a single DeleteObjects request
+S3_DELETE_BATCH_SIZE = 1000
+
 
 class S3Service:
     def __init__(self, folder_prefix: str = settings.s3_folder_prefix):
@@ -65,6 +68,43 @@ class S3Service:
             logger.error(f"Failed to upload image to S3: {e!s}", exc_info=True)
             raise
 
+    def copy_image(self, source_key: str, session_id: str) -> str:
+        """Copy a stored card to a new object for ``session_id`` without downloading it."""
+        timestamp = datetime.now(tz=UTC).strftime("%Y%m%d_%H%M%S")
+        object_key = f"{self.folder_prefix}/{timestamp}_{session_id}.png"
+
+        try:
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=object_key,
+                CopySource={"Bucket": self.bucket_name, "Key": source_key},
+                ACL="private",
+            )
+        except ClientError as e:
+            logger.error(f"Failed to copy {source_key} in S3: {e!s}", exc_info=True)
+            raise
+
+        logger.info(f"Successfully copied {source_key} to s3://{self.bucket_name}/{object_key}")
+        return object_key
+
+    def upload_bytes(self, data: bytes, file_name: str, content_type: str = "application/octet-stream") -> str:
+        object_key = f"{self.folder_prefix}/{file_name}"
+
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=object_key,
+                Body=data,
+                ContentType=content_type,
+                ACL="private",
+            )
+        except ClientError as e:
+            logger.error(f"Failed to upload {file_name} to S3: {e!s}", exc_info=True)
+            raise
+
+        logger.info(f"Successfully uploaded {file_name} to S3: s3://{self.bucket_name}/{object_key}")
+        return object_key
+
     def get_object_url(self, object_key: str, expiration: int = 3600) -> str:
         try:
             return self.s3_client.generate_presigned_url(
@@ -79,13 +119,12 @@ class S3Service:
             )
             raise
 
-    def get_image_base64(self, object_key: str) -> str:
+    def get_image_bytes(self, object_key: str) -> bytes:
         try:
             response = self.s3_client.get_object(Bucket=self.bucket_name, Key=object_key)
             image_data = response["Body"].read()
-            image_base64 = base64.b64encode(image_data).decode("utf-8")
             logger.debug(f"Successfully retrieved image from S3: {object_key}")
-            return image_base64
+            return image_data
         except ClientError as e:
             logger.error(
                 f"Failed to retrieve image from S3: {object_key}: {e!s}",
@@ -93,6 +132,9 @@ class S3Service:
             )
             raise
 
+    def get_image_base64(self, object_key: str) -> str:
+        return base64.b64encode(self.get_image_bytes(object_key)).decode("utf-8")
+
     def delete_object(self, object_key: str) -> None:
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=object_key)
@@ -103,3 +145,31 @@ class S3Service:
                 exc_info=True,
             )
             raise
+
+    def delete_objects(self, object_keys: list[str]) -> tuple[list[str], list[str]]:
+        """Delete up to ``S3_DELETE_BATCH_SIZE`` keys in one request.
+
+        Returns:
+            The keys that were deleted and the keys S3 reported errors for.
+        """
+        if not object_keys:
+            return [], []
+
+        if len(object_keys) > S3_DELETE_BATCH_SIZE:
+            raise ValueError(f"Cannot delete more than {S3_DELETE_BATCH_SIZE} objects per request")
+
+        try:
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": key} for key in object_keys], "Quiet": True},
+            )
+        except ClientError as e:
+            logger.error(f"Failed to delete {len(object_keys)} objects from S3: {e!s}", exc_info=True)
+            raise
+
+        failed_keys = [error["Key"] for error in response.get("Errors", [])]
+        if failed_keys:
+            logger.warning(f"S3 failed to delete {len(failed_keys)} of {len(object_keys)} objects")
+
+        failed = set(failed_keys)
+        return [key for key in object_keys if key not in failed], failed_keys
@@ -0,0 +1 @@
+"""Benchmarks for the card pipeline. Each module is a standalone CLI that writes its results as JSON."""
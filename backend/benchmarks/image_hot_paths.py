@@ -0,0 +1,201 @@
+"""Micro-benchmarks for the image hot paths in ``backend/utils.py``.
+
+Times ``validate_image_format`` and ``compress_image`` on typical uploads and ``create_card`` on generated images of
+both output sizes. The corpus is synthesized deterministically, so runs on the same machine are comparable across code
+changes and Pillow upgrades. Each case runs in a fresh process and also reports its tracemalloc peak (Python-level
+allocations) and how far it pushed peak RSS above the process baseline (which includes Pillow's pixel buffers).
+
+    uv run python -m backend.benchmarks.image_hot_paths --output before.json
+    uv run python -m backend.benchmarks.image_hot_paths --compare before.json
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from functools import partial
+from importlib.metadata import version
+from io import BytesIO
+from pathlib import Path
+
+import psutil
+from PIL import Image, ImageChops
+
+from backend.utils import compress_image, create_card, validate_image_format
+
+CARD_TITLE = "The Migration Maestro"
+
+
+def synthetic_photo(size: tuple[int, int], mode: str = "RGB", seed: int = 0) -> Image.Image:
+    """A smooth gradient overlaid with seeded noise, so images compress roughly like photos."""
+    width, height = size
+    rng = random.Random(seed)  # noqa: S311
+    low_res = (max(width // 16, 1), max(height // 16, 1))
+    blotches = Image.frombytes("RGB", low_res, rng.randbytes(low_res[0] * low_res[1] * 3)).resize(
+        size, Image.Resampling.BICUBIC
+    )
+    grain = Image.frombytes("L", size, rng.randbytes(width * height)).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    image = ImageChops.blend(ImageChops.blend(blotches, gradient, 0.4), grain, 0.1)
+
+    if mode == "RGBA":
+        alpha = Image.radial_gradient("L").resize(size)
+        image.putalpha(alpha)
+    return image
+
+
+def encode(image: Image.Image, image_format: str, **options: object) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def build_corpus() -> tuple[dict[str, bytes], dict[str, str]]:
+    """Return the upload inputs as raw bytes and the generated images as base64, keyed by case name."""
+    uploads = {
+        "heic_3024x4032": encode(synthetic_photo((3024, 4032), seed=1), "HEIF", quality=80),
+        "jpeg_4000x3000": encode(synthetic_photo((4000, 3000), seed=2), "JPEG", quality=92),
+        "png_alpha_2048x2048": encode(synthetic_photo((2048, 2048), mode="RGBA", seed=3), "PNG"),
+        "webp_2048x1536": encode(synthetic_photo((2048, 1536), seed=4), "WEBP", quality=85),
+    }
+    generated = {
+        "generated_1024x1024": base64.b64encode(encode(synthetic_photo((1024, 1024), seed=5), "PNG")).decode(),
+        "generated_1536x1024": base64.b64encode(encode(synthetic_photo((1536, 1024), seed=6), "PNG")).decode(),
+    }
+    return uploads, generated
+
+
+def peak_rss_mb() -> float:
+    # VmHWM is this process's own high-water mark; ru_maxrss also counts the parent's memory before exec on Linux
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 2)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 2)
+
+
+def measure(function: Callable[[], object], repeat: int) -> dict:
+    baseline_rss_mb = round(psutil.Process().memory_info().rss / 1024 / 1024, 2)
+    function()  # Warm up caches and lazy plugin imports
+
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    function()
+    _, allocated_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+        "tracemalloc_peak_mb": round(allocated_peak / 1024 / 1024, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": round(peak_rss_mb() - baseline_rss_mb, 2),
+    }
+
+
+def run(repeat: int, selected: str | None, isolate: bool) -> dict:
+    uploads, generated = build_corpus()
+
+    cases: dict[str, Callable[[], object]] = {}
+    for name, image_data in uploads.items():
+        cases[f"validate_image_format/{name}"] = partial(validate_image_format, image_data)
+        cases[f"compress_image/{name}"] = partial(compress_image, image_data, max_size_bytes=1024 * 1024)
+    for name, image_base64 in generated.items():
+        cases[f"create_card/{name}"] = partial(create_card, image_base64=image_base64, text=CARD_TITLE)
+
+    results = {}
+    for name, function in cases.items():
+        if selected and selected not in name:
+            continue
+
+        if isolate:
+            # A fresh process per case keeps earlier cases (and corpus generation) out of its peak RSS
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results[name] = executor.submit(measure, function, repeat).result()
+        else:
+            results[name] = measure(function, repeat)
+        print(f"{name}: {results[name]['median_ms']} ms", file=sys.stderr)
+
+    return {
+        "benchmark": "image_hot_paths",
+        "timestamp": datetime.now(UTC).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pillow": version("pillow"),
+            "pillow_heif": version("pillow-heif"),
+        },
+        "corpus_bytes": {name: len(data) for name, data in uploads.items()},
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Print median-time and allocation changes against ``baseline`` and return the cases that regressed."""
+    regressions = []
+    print(f"{'case':<50} {'median ms':>22} {'change':>9} {'RSS growth MB':>18}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            print(f"{name:<50} {'(new)':>22}")
+            continue
+
+        change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100
+        if change > threshold:
+            regressions.append(name)
+        print(
+            f"{name:<50} {before['median_ms']:>10.1f} -> {result['median_ms']:>8.1f} {change:>+8.1f}% "
+            f"{before['rss_growth_mb']:>7.1f} -> {result['rss_growth_mb']:>7.1f}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per case")
+    parser.add_argument("--case", help="Only run cases whose name contains this")
+    parser.add_argument("--no-isolate", action="store_true", help="Run every case in this process (faster)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Median slowdown in percent that fails --compare")
+    args = parser.parse_args()
+
+    report = run(repeat=args.repeat, selected=args.case, isolate=not args.no_isolate)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    elif not args.compare:
+        print(output)
+
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text()), report, args.threshold)
+        if regressions:
+            print(f"Slower than baseline by more than {args.threshold}%: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
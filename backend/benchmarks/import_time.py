@@ -0,0 +1,143 @@
+"""Import-time and memory cost of the web and worker entry points.
+
+Imports each entry point in a fresh interpreter with ``python -X importtime`` and reports the wall time, the peak RSS
+and module count after import, and the packages that took longest. It also lists which heavy packages (the LLM stack,
+boto3) each entry point pulled in, so a change that drags them back into the web process is easy to spot.
+
+    uv run python -m backend.benchmarks.import_time --output before.json
+    uv run python -m backend.benchmarks.import_time --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import UTC, datetime
+from pathlib import Path
+
+ENTRY_POINTS = {
+    "web": "backend.main",
+    # The worker imports its tasks on boot, after the entry point itself
+    "worker": "backend.celery_worker, backend.tasks",
+}
+
+HEAVY_PACKAGES = ["llama_index", "langfuse", "openai", "openinference", "boto3", "botocore", "httpx"]
+
+# Runs in the child: import the entry point, then report what it cost
+PROBE = """
+import json, resource, sys, time
+started_at = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started_at
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "peak_rss_mb": peak / 1024 / (1024 if sys.platform == "darwin" else 1),
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict[str, dict[str, int]]:
+    """Map each imported module to its self and cumulative import time in microseconds."""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        timings[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+    return timings
+
+
+def top_packages(timings: dict[str, dict[str, int]], limit: int) -> list[dict]:
+    """Total self time per top-level package, slowest first."""
+    totals: dict[str, int] = defaultdict(int)
+    for name, timing in timings.items():
+        totals[name.split(".")[0]] += timing["self_us"]
+
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"package": package, "ms": round(self_us / 1000, 1)} for package, self_us in ranked]
+
+
+def measure(module: str, repeat: int, limit: int) -> dict:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(  # noqa: S603
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+        runs.append((json.loads(completed.stdout.strip().splitlines()[-1]), parse_importtime(completed.stderr)))
+
+    probe, timings = runs[-1]
+    return {
+        "module": module,
+        "repeat": repeat,
+        "median_seconds": round(statistics.median(run["seconds"] for run, _ in runs), 3),
+        "min_seconds": round(min(run["seconds"] for run, _ in runs), 3),
+        "peak_rss_mb": round(statistics.median(run["peak_rss_mb"] for run, _ in runs), 1),
+        "module_count": len(probe["modules"]),
+        "heavy_packages": [package for package in HEAVY_PACKAGES if package in probe["modules"]],
+        "top_packages": top_packages(timings, limit),
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    print(f"{'entry point':<12} {'import seconds':>20} {'peak RSS MB':>20} {'modules':>16}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            print(f"{name:<12} {'(new)':>20}")
+            continue
+
+        print(
+            f"{name:<12} {before['median_seconds']:>9.2f} -> {result['median_seconds']:>6.2f} "
+            f"{before['peak_rss_mb']:>9.1f} -> {result['peak_rss_mb']:>6.1f} "
+            f"{before['module_count']:>6} -> {result['module_count']:>6}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages to list per entry point")
+    parser.add_argument("--entry-point", choices=ENTRY_POINTS, help="Only measure this entry point")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    args = parser.parse_args()
+
+    results = {}
+    for name, module in ENTRY_POINTS.items():
+        if args.entry_point and args.entry_point != name:
+            continue
+
+        results[name] = measure(module, repeat=args.repeat, limit=args.top)
+        print(f"{name}: {results[name]['median_seconds']} s, {results[name]['peak_rss_mb']} MB", file=sys.stderr)
+
+    report = {
+        "benchmark": "import_time",
+        "timestamp": datetime.now(UTC).isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    elif not args.compare:
+        print(output)
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
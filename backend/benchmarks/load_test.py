@@ -0,0 +1,255 @@
+"""End-to-end load test for card generation.
+
+Each simulated client opens ``/api/stream/{session_id}``, submits ``/api/generate-hero-card`` and waits for the
+``complete`` event. The report covers throughput, time to first partial and time to complete, and the RSS of the local
+Celery worker processes.
+
+Run it against the Docker Compose stack with the worker on the fake image provider so no generations are paid for:
+
+    IMAGE_PROVIDER=fake docker-compose up -d
+    uv run python -m backend.benchmarks.load_test --requests 50 --concurrency 10 --output results.json
+
+Every request sends its own ``X-Forwarded-For`` address so the per-client rate limit does not throttle the run. With no
+proxy in front of the app that address is taken as the one a trusted proxy appended; behind a real proxy, set
+``RATE_LIMIT_ENABLED=false`` for the run instead.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from io import BytesIO
+from pathlib import Path
+
+import httpx
+import psutil
+from PIL import Image
+
+DEFAULT_TEXT = "Rails performance engineer, upgrades and caching"
+
+
+@dataclass
+class RequestResult:
+    session_id: str
+    status: str
+    time_to_first_partial: float | None = None
+    time_to_complete: float | None = None
+    partials: int = 0
+    error: str | None = None
+
+
+class WorkerMemorySampler:
+    """Samples the combined RSS of local processes whose command line contains ``pattern``."""
+
+    def __init__(self, pattern: str, interval: float):
+        self.pattern = pattern
+        self.interval = interval
+        self.samples: list[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> dict | None:
+        self._stop.set()
+        self._thread.join()
+        if not self.samples:
+            return None
+
+        return {
+            "pattern": self.pattern,
+            "samples": len(self.samples),
+            "mean_mb": round(sum(self.samples) / len(self.samples) / 1024 / 1024, 2),
+            "peak_mb": round(max(self.samples) / 1024 / 1024, 2),
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            total = 0
+            for process in psutil.process_iter(["cmdline", "memory_info"]):
+                cmdline = " ".join(process.info["cmdline"] or [])
+                if self.pattern in cmdline and process.pid != psutil.Process().pid and process.info["memory_info"]:
+                    total += process.info["memory_info"].rss
+            if total:
+                self.samples.append(total)
+            self._stop.wait(self.interval)
+
+
+def percentile(values: list[float], percent: float) -> float | None:
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return round(ordered[rank], 4)
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+def load_image(path: str | None) -> tuple[str, bytes, str]:
+    if path:
+        return Path(path).name, Path(path).read_bytes(), "application/octet-stream"
+
+    buffer = BytesIO()
+    Image.linear_gradient("L").resize((1024, 1024)).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return "benchmark.jpg", buffer.getvalue(), "image/jpeg"
+
+
+def record_event(result: RequestResult, event: dict, elapsed: float) -> bool:
+    """Record a stream event on ``result`` and return whether the card is finished."""
+    if event["type"] == "partial":
+        result.partials += 1
+        if result.time_to_first_partial is None:
+            result.time_to_first_partial = elapsed
+    elif event["type"] == "complete":
+        result.status = "complete"
+        result.time_to_complete = elapsed
+    elif event["type"] == "error":
+        result.status = "error"
+        result.error = event.get("message")
+
+    return event["type"] in ("complete", "error")
+
+
+async def run_request(
+    client: httpx.AsyncClient, index: int, image: tuple[str, bytes, str], args: argparse.Namespace
+) -> RequestResult:
+    session_id = str(uuid.uuid4())
+    headers = {"X-Forwarded-For": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+    result = RequestResult(session_id=session_id, status="timeout")
+    started_at = time.perf_counter()
+
+    try:
+        async with asyncio.timeout(args.timeout):
+            async with client.stream("GET", f"/api/stream/{session_id}", headers=headers) as stream:
+                async for line in stream.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+
+                    event = json.loads(line.removeprefix("data: "))
+                    if event["type"] != "connected":
+                        if record_event(result, event, time.perf_counter() - started_at):
+                            return result
+                        continue
+
+                    # Submit only once subscribed so no event can be published before we listen
+                    started_at = time.perf_counter()
+                    response = await client.post(
+                        "/api/generate-hero-card",
+                        headers=headers,
+                        data={"text": args.text, "session_id": session_id, "holiday_theme": str(args.holiday)},
+                        files={"image": image},
+                    )
+                    if response.status_code != 202:
+                        result.status = "rejected"
+                        result.error = f"HTTP {response.status_code}"
+                        return result
+    except TimeoutError:
+        result.error = f"No result within {args.timeout}s"
+    except httpx.HTTPError as error:
+        result.status = "error"
+        result.error = f"{type(error).__name__}: {error}"
+
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    image = load_image(args.image)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+
+        async def bounded(index: int) -> RequestResult:
+            async with semaphore:
+                result = await run_request(client, index, image, args)
+                print(f"[{index + 1}/{args.requests}] {result.status} {result.error or ''}", file=sys.stderr)
+                return result
+
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*(bounded(index) for index in range(args.requests)))
+        elapsed = time.perf_counter() - started_at
+
+    completed = [result for result in results if result.status == "complete"]
+    report = {
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": len(results),
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "throughput_per_second": round(len(completed) / elapsed, 4),
+        "time_to_first_partial": summarize(
+            [result.time_to_first_partial for result in completed if result.time_to_first_partial is not None]
+        ),
+        "time_to_complete": summarize([result.time_to_complete for result in completed]),
+        "errors": dict(Counter(result.error for result in results if result.error)),
+    }
+    if args.include_results:
+        report["results"] = [asdict(result) for result in results]
+
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=20, help="Total number of cards to generate")
+    parser.add_argument("--concurrency", type=int, default=5, help="Cards in flight at once")
+    parser.add_argument("--text", default=DEFAULT_TEXT)
+    parser.add_argument("--holiday", action="store_true", help="Generate holiday cards")
+    parser.add_argument("--image", help="Image to upload; a synthetic 1024x1024 JPEG by default")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for each card")
+    parser.add_argument("--worker-pattern", default="celery", help="Command line substring of worker processes")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between worker RSS samples")
+    parser.add_argument("--include-results", action="store_true", help="Include every request in the report")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    sampler = WorkerMemorySampler(pattern=args.worker_pattern, interval=args.sample_interval)
+    sampler.start()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        worker_rss = sampler.stop()
+
+    report = {
+        "benchmark": "load_test",
+        "timestamp": datetime.now(UTC).isoformat(),
+        "host": platform.node(),
+        "config": {
+            "base_url": args.base_url,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "holiday": args.holiday,
+            "text": args.text,
+        },
+        **report,
+        "worker_rss": worker_rss,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
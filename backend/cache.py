@@ -0,0 +1,117 @@
+"""Two-tier caches: an in-process LRU in front of Redis."""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from llama_index.core.prompts import PromptTemplate
+from redis.asyncio import Redis
+
+from .config import settings
+from .dependencies import get_async_redis_client
+from .logging_config import logger
+from .metrics import validation_cache_requests
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+def hash_prompt(prompt: PromptTemplate) -> str:
+    return hashlib.sha256(prompt.get_template().encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> object | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: object) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ValidationCache:
+    """Caches LLM validation verdicts keyed by the normalised input and the validation prompt.
+
+    Redis is used through the asyncio client so a slow lookup does not stall the image stream and LLM calls sharing
+    the worker's event loop. Redis errors are logged and treated as misses so the cache can never block validation.
+    """
+
+    def __init__(self, redis_client: Redis, ttl: int, max_entries: int):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.local = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    @staticmethod
+    def key(query: str, prompt: PromptTemplate) -> str:
+        digest = hashlib.sha256(f"{hash_prompt(prompt)}:{normalize_text(query)}".encode()).hexdigest()
+        return f"validation:{digest}"
+
+    async def get(self, query: str, prompt: PromptTemplate) -> bool | None:
+        key = self.key(query, prompt)
+
+        is_valid = self.local.get(key)
+        if is_valid is not None:
+            validation_cache_requests.labels(result="local_hit").inc()
+            return is_valid
+
+        try:
+            cached = await self.redis_client.get(key)
+        except Exception as error:
+            logger.warning(f"Validation cache lookup failed: {error}")
+            cached = None
+
+        if cached is None:
+            validation_cache_requests.labels(result="miss").inc()
+            return None
+
+        is_valid = cached == b"1"
+        self.local.set(key, is_valid)
+        validation_cache_requests.labels(result="redis_hit").inc()
+        return is_valid
+
+    async def set(self, query: str, prompt: PromptTemplate, is_valid: bool) -> None:
+        key = self.key(query, prompt)
+        self.local.set(key, is_valid)
+
+        try:
+            await self.redis_client.set(key, "1" if is_valid else "0", ex=self.ttl)
+        except Exception as error:
+            logger.warning(f"Validation cache store failed: {error}")
+
+
+@lru_cache
+def get_validation_cache() -> ValidationCache | None:
+    if not settings.validation_cache_enabled:
+        return None
+
+    return ValidationCache(
+        redis_client=get_async_redis_client(),
+        ttl=settings.validation_cache_ttl,
+        max_entries=settings.validation_cache_max_entries,
+    )
@@ -1,16 +1,27 @@
 from langfuse import get_client, observe, propagate_attributes
 
 from .aws_service import S3Service
+from .card_writer import build_card_record, save_card
 from .config import settings
-from .db import get_session
 from .logging_config import logger
-from .models import Card, CardTheme
+from .metrics import stage_duration
+from .models import CardTheme
+from .result_cache import store_result
+from .trace_export import MediaExport, export_card_media
 from .workflow import ImageGenWorkflow
 from .workflow_holiday import HolidayImageGenWorkflow
 
 langfuse = get_client()
 
 
+def workflow_timeout() -> float:
+    """Upper bound for a workflow run: the LLM stage then the image edit, each retried and, with the shared OpenAI
+    limiter on, queued for a slot. LlamaIndex's own 45 second default would cut both short."""
+    queue_wait = settings.openai_limiter_max_wait if settings.openai_limiter_enabled else 0.0
+    attempts = settings.openai_max_retries + 1
+    return attempts * (2 * queue_wait + settings.llm_timeout + settings.image_edit_timeout)
+
+
 class CardGenerator:
     def __init__(
         self,
@@ -18,6 +29,7 @@ class CardGenerator:
         text: str,
         session_id: str,
         holiday_theme: bool = False,
+        result_cache_key: str | None = None,
     ):
         self.image_data = image_base64
         self.text = text
@@ -26,6 +38,9 @@ class CardGenerator:
         self.s3_service = S3Service(
             folder_prefix=settings.s3_holiday_folder_prefix if holiday_theme else settings.s3_folder_prefix
         )
+        self.result_cache_key = result_cache_key
+        self.trace_id: str | None = None
+        self.observation_id: str | None = None
 
     async def generate(self) -> dict:
         logger.info(f"Generating hero card for session id: {self.session_id}")
@@ -33,6 +48,19 @@ class CardGenerator:
         logger.info(f"Generated hero card for session id: {self.session_id}")
 
         aws_object_key = self._store_card_in_bucket(result["image_base64"])
+        if self.result_cache_key and aws_object_key:
+            store_result(self.result_cache_key, aws_object_key)
+
+        if self.trace_id:
+            export_card_media(
+                MediaExport(
+                    trace_id=self.trace_id,
+                    parent_observation_id=self.observation_id,
+                    session_id=self.session_id,
+                    image_base64=result["image_base64"],
+                    object_key=aws_object_key,
+                )
+            )
 
         self._save_to_db(
             session_id=self.session_id,
@@ -48,7 +76,8 @@ class CardGenerator:
         with propagate_attributes(
             session_id=self.session_id,
         ):
-            workflow = ImageGenWorkflow()
+            self._capture_trace()
+            workflow = ImageGenWorkflow(timeout=workflow_timeout())
             return await workflow.run(image_data=self.image_data, skills=self.text, session_id=self.session_id)
 
     @observe(name="rails_holiday_card_workflow")
@@ -56,17 +85,25 @@ class CardGenerator:
         with propagate_attributes(
             session_id=self.session_id,
         ):
-            workflow = HolidayImageGenWorkflow()
+            self._capture_trace()
+            workflow = HolidayImageGenWorkflow(timeout=workflow_timeout())
             return await workflow.run(image_data=self.image_data, message=self.text, session_id=self.session_id)
 
+    def _capture_trace(self) -> None:
+        """Remember the workflow's trace so the finished card can be attached to it later."""
+        if settings.enable_langfuse:
+            self.trace_id = langfuse.get_current_trace_id()
+            self.observation_id = langfuse.get_current_observation_id()
+
     def _store_card_in_bucket(self, image_data: str) -> str:
         logger.info("Storing image in AWS")
 
         try:
-            object_key = self.s3_service.upload_image(
-                image_base64=image_data,
-                session_id=self.session_id,
-            )
+            with stage_duration.labels(stage="s3_upload").time():
+                object_key = self.s3_service.upload_image(
+                    image_base64=image_data,
+                    session_id=self.session_id,
+                )
             logger.info("Image stored successfully!")
         except Exception as error:
             object_key = None
@@ -82,15 +119,14 @@ class CardGenerator:
         theme: CardTheme,
     ) -> None:
         try:
-            with get_session() as session:
-                card = Card(
+            save_card(
+                build_card_record(
                     session_id=session_id,
                     text=text,
-                    aws_object_key=aws_object_key,
-                    status="complete",
                     theme=theme,
+                    status="complete",
+                    aws_object_key=aws_object_key,
                 )
-                session.add(card)
-                session.commit()
+            )
         except Exception as error:
-            logger.error(f"Failed to save to DB: {error}")
+            logger.error(f"Failed to save card record: {error}")
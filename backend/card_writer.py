@@ -0,0 +1,209 @@
+"""Write-behind buffering for card records.
+
+Cards are inserted with a single multi-row ``INSERT ... ON CONFLICT (session_id) DO NOTHING`` per batch instead of one
+transaction per card. The insert is idempotent, so a batch that is replayed after a crash never duplicates rows.
+
+Modes (``settings.card_write_mode``):
+    immediate: every record is inserted straight away (the default).
+    memory: records are buffered in the worker process and flushed when the batch is full, when the flush interval
+        elapses, or on worker shutdown. Records buffered in a process that is killed outright are lost.
+    redis: records are pushed to a Redis list before the call returns and are only trimmed from it once the batch has
+        been committed, so a crash between the two replays the batch rather than losing it.
+
+In both buffered modes a card's row only exists once its batch is flushed, so anything reading cards by session id or
+exporting them can briefly miss cards that have just finished.
+"""
+
+import contextlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import UTC, datetime
+from functools import lru_cache
+
+from redis import Redis
+from redis.exceptions import LockError
+from sqlalchemy.dialects.postgresql import insert
+
+from .config import settings
+from .db import get_session
+from .dependencies import get_redis_pubsub_client
+from .logging_config import logger
+from .metrics import stage_duration
+from .models import Card, CardTheme
+
+REDIS_BUFFER_KEY = "card_write_buffer"
+REDIS_FLUSH_LOCK_KEY = "card_write_buffer:flush_lock"
+# Renewed after every batch, so it only lapses if a single batch stalls this long
+REDIS_FLUSH_LOCK_TIMEOUT = 60
+
+
+def build_card_record(
+    session_id: str,
+    text: str,
+    theme: CardTheme,
+    status: str,
+    aws_object_key: str | None = None,
+    error_message: str | None = None,
+) -> dict:
+    return {
+        "session_id": session_id,
+        "text": text,
+        "theme": theme,
+        "status": status,
+        "aws_object_key": aws_object_key,
+        "error_message": error_message,
+        "created_at": datetime.now(tz=UTC).replace(tzinfo=None),
+    }
+
+
+def insert_cards(records: list[dict]) -> None:
+    with stage_duration.labels(stage="db_write").time(), get_session() as session:
+        session.execute(insert(Card).on_conflict_do_nothing(index_elements=["session_id"]), records)
+
+
+class CardWriteBuffer(ABC):
+    """Base buffer: flushes when a batch is full and from a background thread once the interval elapses."""
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._flusher: threading.Thread | None = None
+        self._flusher_lock = threading.Lock()
+
+    def add(self, record: dict) -> None:
+        pending = self._append(record)
+        self._ensure_flusher()
+        if pending >= self.batch_size:
+            try:
+                self.flush()
+            except Exception as error:
+                logger.error(f"Card flush failed, buffered records kept for the next flush: {error}")
+
+    @abstractmethod
+    def flush(self) -> int:
+        """Insert the buffered records, keeping them for the next attempt if the insert fails."""
+
+    @abstractmethod
+    def _append(self, record: dict) -> int:
+        """Buffer ``record`` and return how many records are waiting."""
+
+    def _ensure_flusher(self) -> None:
+        # Started lazily so that each Celery prefork child runs its own thread
+        with self._flusher_lock:
+            if self._flusher and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_periodically, name="card-writer", daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as error:
+                logger.error(f"Periodic card flush failed: {error}")
+
+
+class MemoryCardWriteBuffer(CardWriteBuffer):
+    def __init__(self, batch_size: int, flush_interval: float):
+        super().__init__(batch_size, flush_interval)
+        self._records: list[dict] = []
+        self._lock = threading.Lock()
+
+    def _append(self, record: dict) -> int:
+        with self._lock:
+            self._records.append(record)
+            return len(self._records)
+
+    def flush(self) -> int:
+        with self._lock:
+            records, self._records = self._records, []
+        if not records:
+            return 0
+
+        try:
+            insert_cards(records)
+        except Exception:
+            # Keep the records for the next attempt
+            with self._lock:
+                self._records[:0] = records
+            raise
+
+        logger.debug(f"Flushed {len(records)} buffered card records")
+        return len(records)
+
+
+class RedisCardWriteBuffer(CardWriteBuffer):
+    def __init__(self, batch_size: int, flush_interval: float, redis_client: Redis):
+        super().__init__(batch_size, flush_interval)
+        self.redis_client = redis_client
+
+    def _append(self, record: dict) -> int:
+        return self.redis_client.rpush(REDIS_BUFFER_KEY, json.dumps(record, default=str))
+
+    def flush(self) -> int:
+        lock = self.redis_client.lock(REDIS_FLUSH_LOCK_KEY, timeout=REDIS_FLUSH_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            # Another worker is already draining the list
+            return 0
+
+        flushed = 0
+        try:
+            while True:
+                raw_records = self.redis_client.lrange(REDIS_BUFFER_KEY, 0, self.batch_size - 1)
+                if not raw_records:
+                    break
+
+                records = [self._decode(raw_record) for raw_record in raw_records]
+                insert_cards(records)
+                self.redis_client.ltrim(REDIS_BUFFER_KEY, len(raw_records), -1)
+                flushed += len(records)
+                # Raises LockNotOwnedError if the lock lapsed, stopping here rather than racing another flusher
+                lock.extend(REDIS_FLUSH_LOCK_TIMEOUT, replace_ttl=True)
+        finally:
+            with contextlib.suppress(LockError):
+                lock.release()
+
+        if flushed:
+            logger.debug(f"Flushed {flushed} card records from Redis")
+        return flushed
+
+    @staticmethod
+    def _decode(raw_record: str) -> dict:
+        record = json.loads(raw_record)
+        record["theme"] = CardTheme(record["theme"])
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        return record
+
+
+@lru_cache
+def get_card_write_buffer() -> CardWriteBuffer | None:
+    if settings.card_write_mode == "memory":
+        return MemoryCardWriteBuffer(settings.card_write_batch_size, settings.card_write_flush_interval)
+    if settings.card_write_mode == "redis":
+        return RedisCardWriteBuffer(
+            settings.card_write_batch_size, settings.card_write_flush_interval, get_redis_pubsub_client()
+        )
+    return None
+
+
+def save_card(record: dict) -> None:
+    buffer = get_card_write_buffer()
+    if buffer is None:
+        insert_cards([record])
+    else:
+        buffer.add(record)
+
+
+def flush_card_writes() -> None:
+    buffer = get_card_write_buffer()
+    if buffer is None:
+        return
+
+    try:
+        flushed = buffer.flush()
+        logger.info(f"Flushed {flushed} card records on shutdown")
+    except Exception as error:
+        logger.error(f"Failed to flush card records on shutdown: {error}")
@@ -1,12 +1,70 @@
 """Celery app entry point for the worker."""
 
+import gc
+import os
+
 import sentry_sdk
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
 from langfuse import Langfuse
 from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
 
+from .card_writer import flush_card_writes
 from .config import settings
+from .db import dispose_engine_after_fork
 from .dependencies import celery_app  # noqa: F401
 from .exceptions import ImageFormatError, ImageSizeError, InputValidationError
+from .llms import close_clients, start_event_loop
+from .logging_config import logger, stop_queue_listener
+from .metrics import mark_process_dead, start_metrics_server
+from .trace_export import flush_trace_exports
+
+
+def preload_worker() -> None:
+    """Load what every task needs in the parent so pool children share it instead of each loading a copy.
+
+    Freezing moves everything allocated so far out of the garbage collector's reach; otherwise the first collection
+    in each child writes to every object's GC header and copies the shared pages anyway.
+    """
+    import boto3
+
+    from . import tasks  # noqa: F401
+    from .utils import branding_logo, card_font
+
+    card_font()
+    branding_logo()
+    # Loads and caches botocore's S3 service model on the default session that S3Service clients are created from
+    boto3.client("s3", region_name=settings.aws_region)
+
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded worker modules, froze {gc.get_freeze_count()} objects")
+
+
+@worker_init.connect
+def init_worker(**_kwargs) -> None:
+    if settings.worker_metrics_port:
+        start_metrics_server(settings.worker_metrics_port)
+        logger.info(f"Serving worker metrics on port {settings.worker_metrics_port}")
+    if settings.worker_preload:
+        preload_worker()
+
+
+@worker_process_init.connect
+def init_worker_process(**_kwargs) -> None:
+    dispose_engine_after_fork()
+    start_event_loop()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_process(**_kwargs) -> None:
+    flush_card_writes()
+    flush_trace_exports()
+    close_clients()
+    mark_process_dead(os.getpid())
+    # Pool processes exit without running atexit hooks, so drain queued log records here
+    stop_queue_listener()
+
 
 if settings.environment == "production":
     sentry_sdk.init(
@@ -0,0 +1,275 @@
+"""Cluster-wide adaptive concurrency limits for OpenAI calls.
+
+Image edits and LLM calls each have a pool whose limit, in-flight leases and queue of waiters live in Redis, so every
+worker process shares them. A call waits in the queue, first come first served, until the number of leases is below the
+limit. The limit adapts AIMD-style: each call that finishes within the pool's latency target raises it by ``1 / limit``
+(about one slot per round of calls), while a 429 or a slow call cuts it by ``openai_limiter_backoff``. Only calls
+started after the last cut can cut it again, so a burst of 429s from calls already in flight counts once.
+
+Rate-limited calls are retried here, through the queue, instead of by the OpenAI client. Leases and waiters expire, so
+a worker that dies holding a slot does not shrink the pool for good. If Redis is unavailable calls go ahead unlimited.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from typing import Literal, TypeVar
+
+import openai
+
+from .config import settings
+from .dependencies import get_async_redis_client
+from .exceptions import OpenAIQueueTimeoutError
+from .logging_config import logger
+from .metrics import openai_calls_in_flight, openai_concurrency_limit, stage_duration
+
+Pool = Literal["image", "llm"]
+
+T = TypeVar("T")
+
+# Errors the OpenAI client would otherwise retry itself; 429s and timeouts also shrink the pool's limit
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+CONGESTION_ERRORS = (openai.RateLimitError, openai.APITimeoutError)
+
+# KEYS: limit hash, leases (by expiry), queue (by ticket), waiter heartbeats (by last poll)
+# ARGV: waiter id, initial limit, lease ttl, seconds after which a silent waiter is dropped
+# Returns {1, acquired_at} once the waiter is at the front and a slot is free, else {0, position in the queue}.
+ACQUIRE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local waiter = ARGV[1]
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local stale = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now - tonumber(ARGV[4]))
+for _, id in ipairs(stale) do
+    redis.call('ZREM', KEYS[3], id)
+    redis.call('ZREM', KEYS[4], id)
+end
+
+if not redis.call('ZSCORE', KEYS[3], waiter) then
+    redis.call('ZADD', KEYS[3], redis.call('HINCRBY', KEYS[1], 'tickets', 1), waiter)
+end
+redis.call('ZADD', KEYS[4], now, waiter)
+
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit'))
+if not limit then
+    limit = tonumber(ARGV[2])
+    redis.call('HSET', KEYS[1], 'limit', limit)
+end
+
+local position = redis.call('ZRANK', KEYS[3], waiter)
+if position >= math.floor(limit) - redis.call('ZCARD', KEYS[2]) then
+    return {0, position}
+end
+
+redis.call('ZREM', KEYS[3], waiter)
+redis.call('ZREM', KEYS[4], waiter)
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), waiter)
+return {1, tostring(now)}
+"""
+
+# KEYS: limit hash, leases
+# ARGV: lease id, acquired_at, 1 if the call was congested (429 or slow), initial, min and max limit, backoff
+# Returns the pool's new limit.
+RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+
+local state = redis.call('HMGET', KEYS[1], 'limit', 'decreased_at')
+local limit = tonumber(state[1]) or tonumber(ARGV[4])
+local decreased_at = tonumber(state[2]) or 0
+
+if ARGV[3] == '1' then
+    if tonumber(ARGV[2]) >= decreased_at then
+        local time = redis.call('TIME')
+        limit = math.max(tonumber(ARGV[5]), limit * tonumber(ARGV[7]))
+        redis.call('HSET', KEYS[1], 'limit', limit, 'decreased_at', tonumber(time[1]) + tonumber(time[2]) / 1000000)
+    end
+else
+    limit = math.min(tonumber(ARGV[6]), limit + 1 / limit)
+    redis.call('HSET', KEYS[1], 'limit', limit)
+end
+return tostring(limit)
+"""
+
+FORGET_WAITER_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+"""
+
+
+@dataclass(frozen=True)
+class PoolLimits:
+    initial: int
+    maximum: int
+    latency_target: float
+
+
+def pool_limits(pool: Pool) -> PoolLimits:
+    if pool == "image":
+        return PoolLimits(
+            initial=settings.openai_image_concurrency,
+            maximum=settings.openai_image_max_concurrency,
+            latency_target=settings.openai_image_latency_target,
+        )
+    return PoolLimits(
+        initial=settings.openai_llm_concurrency,
+        maximum=settings.openai_llm_max_concurrency,
+        latency_target=settings.openai_llm_latency_target,
+    )
+
+
+@dataclass
+class Lease:
+    pool: Pool
+    id: str
+    acquired_at: float | None
+    congested: bool = False
+
+
+class ConcurrencyLimiter:
+    def __init__(self, prefix: str = "openai_limit"):
+        self.prefix = prefix
+
+    def _keys(self, pool: Pool) -> list[str]:
+        base = f"{self.prefix}:{pool}"
+        return [base, f"{base}:leases", f"{base}:queue", f"{base}:waiters"]
+
+    async def acquire(self, pool: Pool) -> Lease:
+        """Wait in the pool's queue for a slot; ``acquired_at`` is None when Redis could not be reached."""
+        redis_client = get_async_redis_client()
+        keys = self._keys(pool)
+        lease_id = uuid.uuid4().hex
+        args = [
+            lease_id,
+            pool_limits(pool).initial,
+            settings.openai_limiter_lease_ttl,
+            settings.openai_limiter_poll * 20,
+        ]
+
+        started_at = time.perf_counter()
+        try:
+            while True:
+                try:
+                    acquired, value = await redis_client.eval(ACQUIRE_SCRIPT, len(keys), *keys, *args)
+                except Exception as error:
+                    logger.warning(f"OpenAI concurrency limiter unavailable, calling without a slot: {error}")
+                    return Lease(pool=pool, id=lease_id, acquired_at=None)
+
+                if acquired:
+                    stage_duration.labels(stage=f"{pool}_queue").observe(time.perf_counter() - started_at)
+                    openai_calls_in_flight.labels(pool=pool).inc()
+                    return Lease(pool=pool, id=lease_id, acquired_at=float(value))
+
+                if time.perf_counter() - started_at > settings.openai_limiter_max_wait:
+                    raise OpenAIQueueTimeoutError(pool, int(value))
+                await asyncio.sleep(settings.openai_limiter_poll * random.uniform(0.5, 1.5))  # noqa: S311
+        except BaseException:
+            try:
+                await redis_client.eval(FORGET_WAITER_SCRIPT, 2, keys[2], keys[3], lease_id)
+            except Exception as error:
+                logger.warning(f"Could not leave the OpenAI {pool} queue: {error}")
+            raise
+
+    async def release(self, lease: Lease, latency: float) -> None:
+        if lease.acquired_at is None:
+            return
+
+        openai_calls_in_flight.labels(pool=lease.pool).dec()
+        limits = pool_limits(lease.pool)
+        congested = lease.congested or latency > limits.latency_target
+        keys = self._keys(lease.pool)[:2]
+        args = [
+            lease.id,
+            lease.acquired_at,
+            int(congested),
+            limits.initial,
+            settings.openai_limiter_min_concurrency,
+            limits.maximum,
+            settings.openai_limiter_backoff,
+        ]
+        try:
+            limit = await get_async_redis_client().eval(RELEASE_SCRIPT, len(keys), *keys, *args)
+        except Exception as error:
+            logger.warning(f"Could not release OpenAI {lease.pool} slot: {error}")
+            return
+
+        openai_concurrency_limit.labels(pool=lease.pool).set(float(limit))
+        if congested:
+            logger.info(f"OpenAI {lease.pool} calls congested, concurrency limit now {float(limit):.1f}")
+
+    @asynccontextmanager
+    async def slot(self, pool: Pool) -> AsyncIterator[Lease]:
+        """Hold a slot in ``pool`` for the block; a 429 or timeout raised from it counts as congestion."""
+        lease = await self.acquire(pool)
+        started_at = time.perf_counter()
+        try:
+            yield lease
+        except CONGESTION_ERRORS:
+            lease.congested = True
+            raise
+        finally:
+            await self.release(lease, time.perf_counter() - started_at)
+
+    async def call(self, pool: Pool, request: Callable[[], Awaitable[T]]) -> T:
+        """Make ``request`` in a slot, queueing again for a new slot each time it fails with a retryable error."""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(pool):
+                    return await request()
+            except RETRYABLE_ERRORS as error:
+                if attempt >= settings.openai_max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(error, attempt))
+                attempt += 1
+
+    async def stream(self, pool: Pool, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Like ``call`` for a streamed response: the slot is held until the stream ends, and a stream that fails
+        before yielding anything is retried."""
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.slot(pool), aclosing(open_stream()) as items:
+                    async for item in items:
+                        started = True
+                        yield item
+                return
+            except RETRYABLE_ERRORS as error:
+                if started or attempt >= settings.openai_max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(error, attempt))
+                attempt += 1
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """The server's ``Retry-After`` when it sent one, otherwise jittered exponential backoff."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after", "")), 60.0)
+        except ValueError:
+            pass
+    return min(2**attempt, 30) * random.uniform(0.5, 1.0)  # noqa: S311
+
+
+limiter = ConcurrencyLimiter()
+
+
+async def limited(pool: Pool, request: Callable[[], Awaitable[T]]) -> T:
+    """Make an OpenAI request under the pool's shared limit when the limiter is enabled."""
+    if not settings.openai_limiter_enabled:
+        return await request()
+    return await limiter.call(pool, request)
+
+
+async def limited_stream(pool: Pool, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+    """Stream an OpenAI response under the pool's shared limit when the limiter is enabled."""
+    stream = limiter.stream(pool, open_stream) if settings.openai_limiter_enabled else open_stream()
+    async with aclosing(stream) as items:
+        async for item in items:
+            yield item
@@ -24,12 +24,108 @@ class Settings(BaseSettings):
             return v.replace("postgres://", "postgresql://", 1)
         return v
 
+    @property
+    def async_database_url(self) -> str:
+        url = self.database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+        # asyncpg takes `ssl` rather than libpq's `sslmode`
+        return url.replace("sslmode=", "ssl=")
+
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+
+    # "memory" and "redis" batch card inserts; a card's row then only exists after the next flush (up to
+    # card_write_flush_interval seconds), so reads by session_id and exports can miss cards that just finished
+    card_write_mode: Literal["immediate", "memory", "redis"] = "immediate"
+    card_write_batch_size: int = 50
+    card_write_flush_interval: float = 5.0
+
+    # Cards older than this many days are purged daily; retention is off when unset
+    card_retention_days: int | None = None
+    card_retention_hour: int = 3
+    card_retention_page_size: int = 5000
+    card_retention_concurrency: int = 4
+
     log_level: str = "DEBUG"
+    # Production logging: "json" lines and a queue so log writes happen off the calling thread
+    log_format: Literal["color", "json"] = "color"
+    log_async: bool = False
+    # Fraction of log_memory_usage calls that sample and log RSS
+    log_memory_sample_rate: float = 1.0
+
+    # cProfile card tasks: always, for a fraction of them, or when X-Profile matches the token
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.0
+    profiling_token: str | None = None
+    profiling_output: Literal["local", "s3"] = "local"
+    profiling_dir: str = "/tmp/profiles"  # noqa: S108
+
+    # Bearer token Prometheus sends to scrape the web app's /metrics; the endpoint is disabled when unset
+    metrics_token: str | None = None
+    # Port for the worker's Prometheus exporter; set PROMETHEUS_MULTIPROC_DIR too when running the prefork pool
+    worker_metrics_port: int | None = None
+    # Import the task stack and card assets in the parent and gc.freeze() them before the pool forks
+    worker_preload: bool = True
+    # Replace a pool child after a task leaves it above this resident memory (MB) or after this many tasks
+    worker_max_memory_per_child_mb: int | None = 600
+    worker_max_tasks_per_child: int | None = None
 
     openai_api_key: str
     openai_max_retries: int = 3
+    openai_http2: bool = True
+    openai_max_connections: int = 20
+    openai_max_keepalive_connections: int = 10
+    openai_keepalive_expiry: float = 60.0
+    openai_connect_timeout: float = 5.0
+    llm_timeout: float = 30.0
+    image_edit_timeout: float = 180.0
     llm_temperature: float = 0.9
 
+    # Share adaptive concurrency limits for image edits and LLM calls across workers through Redis; calls queue for a
+    # slot and 429s are retried through the queue rather than by the OpenAI client
+    openai_limiter_enabled: bool = False
+    openai_image_concurrency: int = 8
+    openai_image_max_concurrency: int = 32
+    openai_image_latency_target: float = 90.0
+    openai_llm_concurrency: int = 32
+    openai_llm_max_concurrency: int = 128
+    openai_llm_latency_target: float = 10.0
+    openai_limiter_min_concurrency: int = 1
+    # Factor the limit is multiplied by after a 429, timeout or call slower than the pool's latency target
+    openai_limiter_backoff: float = 0.7
+    openai_limiter_poll: float = 0.1
+    openai_limiter_max_wait: float = 300.0
+    # Leases of workers that died mid-call are freed after this long
+    openai_limiter_lease_ttl: float = 600.0
+
+    input_max_length: int = 500
+
+    # Fraction of superhero workflows that validate and name the input in one LLM call instead of two
+    combined_validation_rate: float = 0.0
+
+    validation_cache_enabled: bool = True
+    validation_cache_ttl: int = 7 * 24 * 60 * 60
+    validation_cache_max_entries: int = 1024
+
+    # Serve the stored card again when the same photo, text and theme are submitted
+    result_cache_enabled: bool = False
+    result_cache_ttl: int = 24 * 60 * 60
+    # Reuses before the entry is dropped and the next submission generates a new card; None reuses until expiry
+    result_cache_max_reuses: int | None = None
+
+    # Start the image edit alongside input validation. Saves the validation time (a second or two) from every card, but
+    # each input the LLM validator rejects still pays for an image edit that is thrown away; inputs the local
+    # pre-filter rejects never reach the worker
+    speculative_image_generation: bool = False
+
+    # "fake" streams local placeholder images instead of calling OpenAI, for load testing
+    image_provider: Literal["openai", "fake"] = "openai"
+    image_partial_images: int = 3
+    fake_image_partial_delay: float = 4.0
+    fake_image_final_delay: float = 6.0
+
     image_gen_model: str = "gpt-image-1"
     default_llm: str = "gpt-4o-mini"
 
@@ -50,6 +146,11 @@ class Settings(BaseSettings):
     s3_bucket_name: str | None = None
     s3_folder_prefix: str | None = None
     s3_holiday_folder_prefix: str | None = None
+    s3_profiles_folder_prefix: str = "profiles"
+
+    # Token for the card ZIP export endpoint, sent as X-Export-Token; the endpoint is disabled when unset
+    export_token: str | None = None
+    export_prefetch: int = 8
 
     redis_url: str = "redis://localhost:6379/0"
 
@@ -60,8 +161,27 @@ class Settings(BaseSettings):
     langfuse_secret_key: str = ""
     langfuse_public_key: str = ""
     langfuse_base_url: str = ""
+    # How finished cards are attached to traces: "none", "thumbnail", "s3_reference" or "full"
+    langfuse_media_mode: Literal["none", "thumbnail", "s3_reference", "full"] = "thumbnail"
+    langfuse_media_sample_rate: float = 1.0
+    langfuse_media_thumbnail_size: int = 256
+    langfuse_media_queue_size: int = 32
 
     price_per_image: float = 0.04
 
+    # Token-bucket budgets for card submissions: each allows `limit` cards per `window` seconds
+    rate_limit_enabled: bool = True
+    rate_limit_ip: int = 2
+    rate_limit_ip_window: float = 5.0
+    # Best-effort only: session ids are chosen by the client
+    rate_limit_session: int = 2
+    rate_limit_session_window: float = 60.0
+    rate_limit_global: int = 120
+    rate_limit_global_window: float = 60.0
+    # Proxies in front of the app that append to X-Forwarded-For (1 for the Heroku router); 0 uses the peer address
+    trusted_proxy_count: int = 1
+    # Dollars of image generation allowed per minute across all users, charged at price_per_image per card
+    max_spend_per_minute: float | None = None
+
 
 settings = Settings()
@@ -1,14 +1,27 @@
-from contextlib import contextmanager
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Generator
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from .config import settings
 
-engine = create_engine(settings.database_url)
+pool_options = {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+    "pool_recycle": settings.db_pool_recycle,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+}
+
+engine = create_engine(settings.database_url, **pool_options)
 SessionLocal = sessionmaker(bind=engine)
 
+# Used by the FastAPI routes so DB lookups don't block the event loop
+async_engine = create_async_engine(settings.async_database_url, **pool_options)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
 
 @contextmanager
 def get_session() -> Generator[Session, None, None]:
@@ -21,3 +34,26 @@ def get_session() -> Generator[Session, None, None]:
         raise
     finally:
         session.close()
+
+
+@asynccontextmanager
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """Session for request handlers; its only user today is the card insert when a cached result is reused."""
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+def dispose_engine_after_fork() -> None:
+    """Drop pooled connections inherited from the parent process.
+
+    Celery prefork children share the parent's sockets after fork. Discarding the pool without closing the
+    connections leaves the parent's connections intact while each child opens its own.
+    """
+    engine.dispose(close=False)
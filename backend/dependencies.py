@@ -2,12 +2,13 @@
 
 import ssl
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from urllib.parse import urlparse
 
 import redis.asyncio as redis
 from celery import Celery
+from celery.schedules import crontab
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
 from redis import Redis
 
 from .config import settings
@@ -29,6 +30,20 @@ celery_app = Celery(
 celery_app.conf.result_extended = True
 celery_app.autodiscover_tasks(["backend.tasks"])
 celery_app.conf.result_expires = 300
+# Keep the JSON or queued handlers set up in logging_config rather than Celery's own
+celery_app.conf.worker_hijack_root_logger = settings.log_format == "color" and not settings.log_async
+# Celery measures this in kilobytes
+if settings.worker_max_memory_per_child_mb:
+    celery_app.conf.worker_max_memory_per_child = settings.worker_max_memory_per_child_mb * 1024
+celery_app.conf.worker_max_tasks_per_child = settings.worker_max_tasks_per_child
+
+if settings.card_retention_days:
+    celery_app.conf.beat_schedule = {
+        "purge-expired-cards": {
+            "task": "purge_expired_cards",
+            "schedule": crontab(hour=settings.card_retention_hour, minute=0),
+        },
+    }
 
 
 def get_redis_pubsub_client() -> Redis:
@@ -43,21 +58,27 @@ def get_redis_pubsub_client() -> Redis:
     )
 
 
-@asynccontextmanager
-async def lifespan(_: FastAPI) -> None:
-    """Lifespan context manager initialising the rate limiter.
+@lru_cache
+def get_redis_client() -> Redis:
+    """Process-wide client for short commands; redis-py resets its connection pool after a fork."""
+    return get_redis_pubsub_client()
+
 
-    Define the context manager to be passed to the FastAPI app object so rate limiting can be applied.
-    """
+@lru_cache
+def get_async_redis_client() -> redis.Redis:
+    """Process-wide asyncio client, for the web app and for coroutines on a worker's event loop."""
     url = urlparse(settings.redis_url)
-    redis_connection = redis.Redis(
+    return redis.Redis(
         host=url.hostname,
         port=url.port,
         password=url.password,
         ssl=(url.scheme == "rediss"),
         ssl_cert_reqs="none",
     )
-    await FastAPILimiter.init(redis_connection)
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> None:
+    """Lifespan context manager closing the shared asyncio Redis client on shutdown."""
     yield
-    await FastAPILimiter.close()
+    await get_async_redis_client().aclose()
@@ -17,3 +17,21 @@ class ImageSizeError(Exception):
     """Raised when uploaded image size exceeds the limit."""
 
     pass
+
+
+class RateLimitExceededError(Exception):
+    """Raised when a request exceeds one of the rate limiting budgets."""
+
+    def __init__(self, budget: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {budget} budget")
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+class OpenAIQueueTimeoutError(Exception):
+    """Raised when an OpenAI call waited too long for a slot in its concurrency pool."""
+
+    def __init__(self, pool: str, position: int):
+        super().__init__(f"Timed out waiting for an OpenAI {pool} slot at position {position} in the queue")
+        self.pool = pool
+        self.position = position
@@ -0,0 +1,202 @@
+"""Streaming ZIP export of finished cards, for handing an event's cards to its organisers.
+
+Cards are selected by creation date and theme and paged from the database like retention does. Objects are fetched
+from S3 on a thread pool at most ``prefetch`` cards ahead of the writer and each is written to the archive as soon as
+it arrives, so memory stays bounded by the prefetch window however many cards are exported. Entries are stored
+uncompressed since the PNGs are already compressed, and a ``manifest.csv`` lists every card and whether it made it in.
+
+    uv run python -m backend.export --since 2026-05-14 --until 2026-05-16 --theme superhero --output cards.zip
+"""
+
+import argparse
+import csv
+import io
+import tempfile
+import zipfile
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from uuid import UUID
+
+from sqlalchemy import select, tuple_
+
+from .aws_service import S3Service
+from .config import settings
+from .db import get_session
+from .logging_config import logger
+from .models import Card, CardTheme
+
+MANIFEST_SPOOL_SIZE = 1024 * 1024
+MANIFEST_CHUNK_SIZE = 64 * 1024
+MANIFEST_FIELDS = ["file", "card_id", "session_id", "theme", "created_at", "text", "status"]
+
+
+@dataclass(frozen=True)
+class ExportedCard:
+    id: UUID
+    session_id: str
+    text: str
+    theme: CardTheme
+    aws_object_key: str
+    created_at: datetime
+
+    @property
+    def file_name(self) -> str:
+        # Named by the card's own id: session ids are chosen by the client and could add path segments to the entry
+        return f"{self.theme}/{self.created_at:%Y%m%d_%H%M%S}_{self.id}.png"
+
+
+def select_cards(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    theme: CardTheme | None = None,
+    page_size: int = 500,
+) -> Iterator[ExportedCard]:
+    """Yield completed cards created in ``[since, until)``, oldest first, one short-lived session per page."""
+    last_seen = None
+    while True:
+        query = select(Card.id, Card.session_id, Card.text, Card.theme, Card.aws_object_key, Card.created_at).where(
+            Card.status == "complete", Card.aws_object_key.is_not(None)
+        )
+        if since:
+            query = query.where(Card.created_at >= since)
+        if until:
+            query = query.where(Card.created_at < until)
+        if theme:
+            query = query.where(Card.theme == theme)
+        if last_seen:
+            query = query.where(tuple_(Card.created_at, Card.id) > last_seen)
+        query = query.order_by(Card.created_at, Card.id).limit(page_size)
+
+        with get_session() as session:
+            rows = session.execute(query).all()
+        if not rows:
+            return
+        last_seen = (rows[-1].created_at, rows[-1].id)
+
+        for row in rows:
+            yield ExportedCard(
+                id=row.id,
+                session_id=row.session_id,
+                text=row.text,
+                theme=row.theme,
+                aws_object_key=row.aws_object_key,
+                created_at=row.created_at,
+            )
+
+
+def fetch_objects(
+    cards: Iterable[ExportedCard], s3_service: S3Service, prefetch: int
+) -> Iterator[tuple[ExportedCard, bytes | None]]:
+    """Yield each card with its PNG, in order, keeping at most ``prefetch`` downloads in flight or waiting."""
+
+    def download(card: ExportedCard) -> bytes | None:
+        try:
+            return s3_service.get_image_bytes(card.aws_object_key)
+        except Exception as error:
+            logger.warning(f"Skipping card {card.session_id} in export: {error}")
+            return None
+
+    pending: deque[tuple[ExportedCard, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        for card in cards:
+            pending.append((card, executor.submit(download, card)))
+            if len(pending) >= prefetch:
+                card, future = pending.popleft()
+                yield card, future.result()
+
+        while pending:
+            card, future = pending.popleft()
+            yield card, future.result()
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes back in chunks, so ZipFile streams its output."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(cards: Iterable[tuple[ExportedCard, bytes | None]]) -> Iterator[bytes]:
+    buffer = _ChunkBuffer()
+
+    # The manifest grows with the export, so it is spooled to disk past MANIFEST_SPOOL_SIZE and copied in at the end
+    with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_SIZE) as manifest_file:
+        manifest = io.TextIOWrapper(manifest_file, encoding="utf-8", newline="")
+        writer = csv.DictWriter(manifest, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for card, image in cards:
+                if image is not None:
+                    entry = zipfile.ZipInfo(card.file_name, date_time=card.created_at.timetuple()[:6])
+                    archive.writestr(entry, image, compress_type=zipfile.ZIP_STORED)
+                    yield buffer.drain()
+
+                writer.writerow(
+                    {
+                        "file": card.file_name if image is not None else "",
+                        "card_id": str(card.id),
+                        "session_id": card.session_id,
+                        "theme": card.theme,
+                        "created_at": card.created_at.isoformat(),
+                        "text": card.text,
+                        "status": "exported" if image is not None else "missing",
+                    }
+                )
+
+            manifest.flush()
+            manifest_file.seek(0)
+            entry = zipfile.ZipInfo("manifest.csv", date_time=datetime.now().timetuple()[:6])
+            with archive.open(entry, mode="w") as manifest_entry:
+                while chunk := manifest_file.read(MANIFEST_CHUNK_SIZE):
+                    manifest_entry.write(chunk)
+                    yield buffer.drain()
+        manifest.detach()
+    yield buffer.drain()
+
+
+def export_cards(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    theme: CardTheme | None = None,
+    prefetch: int = settings.export_prefetch,
+) -> Iterator[bytes]:
+    """Stream a ZIP archive of the selected cards as byte chunks."""
+    cards = select_cards(since=since, until=until, theme=theme)
+    yield from stream_zip(fetch_objects(cards, S3Service(), prefetch=prefetch))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only cards created at or after this (UTC)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Only cards created before this (UTC)")
+    parser.add_argument("--theme", type=CardTheme, choices=list(CardTheme))
+    parser.add_argument("--prefetch", type=int, default=settings.export_prefetch, help="Concurrent S3 downloads")
+    parser.add_argument("--output", required=True, help="Path of the ZIP file to write")
+    args = parser.parse_args()
+
+    written = 0
+    with Path(args.output).open("wb") as output:
+        for chunk in export_cards(since=args.since, until=args.until, theme=args.theme, prefetch=args.prefetch):
+            written += output.write(chunk)
+    logger.info(f"Wrote {written / 1024 / 1024:.1f} MB of cards to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
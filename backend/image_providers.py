@@ -0,0 +1,124 @@
+"""Image-generation backends used by the card workflows.
+
+``openai`` streams real edits from the OpenAI Images API. ``fake`` streams deterministic local PNGs with configurable
+timing so the rest of the pipeline (Celery, Redis fan-out, card rendering, S3, DB) can be load-tested for free.
+"""
+
+import asyncio
+import base64
+import random
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from io import BytesIO
+
+from PIL import Image
+
+from .concurrency import limited_stream
+from .config import settings
+from .llms import async_openai_client, image_edit_timeout
+from .logging_config import logger
+
+
+@dataclass(frozen=True)
+class GeneratedImage:
+    image_base64: str
+    is_final: bool
+
+
+class ImageProvider(ABC):
+    name: str
+    model: str
+
+    @abstractmethod
+    def edit(self, image_data: bytes, prompt: str) -> AsyncIterator[GeneratedImage]:
+        """Stream the partial images followed by the final image for an edit of ``image_data``."""
+
+
+class OpenAIImageProvider(ImageProvider):
+    name = "openai"
+
+    def __init__(self, model: str, size: str, partial_images: int):
+        self.model = model
+        self.size = size
+        self.partial_images = partial_images
+
+    def edit(self, image_data: bytes, prompt: str) -> AsyncIterator[GeneratedImage]:
+        return limited_stream("image", partial(self._stream_edit, image_data, prompt))
+
+    async def _stream_edit(self, image_data: bytes, prompt: str) -> AsyncIterator[GeneratedImage]:
+        image_file = BytesIO(image_data)
+        image_file.name = settings.mock_upload_file_name
+
+        stream = await async_openai_client.images.edit(
+            image=image_file,
+            prompt=prompt,
+            model=self.model,
+            n=1,
+            size=self.size,
+            stream=True,
+            partial_images=self.partial_images,
+            timeout=image_edit_timeout,
+        )
+
+        try:
+            async for event in stream:
+                logger.debug("Received event type: %s", event.type)
+
+                if event.type == "image_generation.partial_image" or event.type == "image_edit.partial_image":
+                    yield GeneratedImage(image_base64=event.b64_json, is_final=False)
+                elif event.type == "image_generation.completed" or event.type == "image_edit.completed":
+                    yield GeneratedImage(image_base64=event.b64_json, is_final=True)
+                else:
+                    logger.warning(f"Unknown event type: {event.type}")
+        finally:
+            await stream.close()
+
+
+class FakeImageProvider(ImageProvider):
+    """Streams pre-rendered noise PNGs, which compress about as badly as real generations, after fixed delays."""
+
+    name = "fake"
+    model = "fake"
+
+    def __init__(self, size: str, partial_images: int, partial_delay: float, final_delay: float):
+        self.size = size
+        self.partial_images = partial_images
+        self.partial_delay = partial_delay
+        self.final_delay = final_delay
+
+    async def edit(self, image_data: bytes, prompt: str) -> AsyncIterator[GeneratedImage]:  # noqa: ARG002
+        for index in range(self.partial_images):
+            await asyncio.sleep(self.partial_delay)
+            yield GeneratedImage(image_base64=render_fake_image(self.size, index), is_final=False)
+
+        await asyncio.sleep(self.final_delay)
+        yield GeneratedImage(image_base64=render_fake_image(self.size, self.partial_images), is_final=True)
+
+
+@lru_cache(maxsize=8)
+def render_fake_image(size: str, seed: int) -> str:
+    width, height = (int(dimension) for dimension in size.split("x"))
+    noise = random.Random(seed).randbytes(width * height * 3)  # noqa: S311
+
+    buffer = BytesIO()
+    Image.frombytes("RGB", (width, height), noise).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+@lru_cache
+def get_image_provider() -> ImageProvider:
+    if settings.image_provider == "fake":
+        return FakeImageProvider(
+            size=settings.generated_image_size,
+            partial_images=settings.image_partial_images,
+            partial_delay=settings.fake_image_partial_delay,
+            final_delay=settings.fake_image_final_delay,
+        )
+
+    return OpenAIImageProvider(
+        model=settings.image_gen_model,
+        size=settings.generated_image_size,
+        partial_images=settings.image_partial_images,
+    )
@@ -1,16 +1,94 @@
+"""Shared OpenAI clients.
+
+Each process keeps one pooled sync and async HTTP client, so connections (and their TLS sessions) are reused across
+calls and Celery tasks. Async connections are bound to the event loop they were opened on, so worker tasks run on a
+persistent per-process loop via ``run_async`` instead of a fresh ``asyncio.run`` each time.
+"""
+
+import asyncio
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+import httpx
 from llama_index.llms.openai import OpenAI
 
 from .config import settings
 
 if settings.enable_langfuse:
+    from langfuse.openai import AsyncOpenAI as AsyncOpenAIClient
     from langfuse.openai import OpenAI as OpenAIClient
 else:
+    from openai import AsyncOpenAI as AsyncOpenAIClient
     from openai import OpenAI as OpenAIClient
 
-openai_client = OpenAIClient(api_key=settings.openai_api_key, max_retries=settings.openai_max_retries)
+# With the shared limiter on, retries go back through its queue instead of straight to the API
+max_retries = 0 if settings.openai_limiter_enabled else settings.openai_max_retries
+
+llm_timeout = httpx.Timeout(settings.llm_timeout, connect=settings.openai_connect_timeout)
+image_edit_timeout = httpx.Timeout(settings.image_edit_timeout, connect=settings.openai_connect_timeout)
+
+
+def _http_client_options() -> dict:
+    return {
+        "http2": settings.openai_http2,
+        "timeout": llm_timeout,
+        "limits": httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+            keepalive_expiry=settings.openai_keepalive_expiry,
+        ),
+    }
+
+
+http_client = httpx.Client(**_http_client_options())
+async_http_client = httpx.AsyncClient(**_http_client_options())
+
+openai_client = OpenAIClient(
+    api_key=settings.openai_api_key,
+    max_retries=max_retries,
+    timeout=llm_timeout,
+    http_client=http_client,
+)
+async_openai_client = AsyncOpenAIClient(
+    api_key=settings.openai_api_key,
+    max_retries=max_retries,
+    timeout=llm_timeout,
+    http_client=async_http_client,
+)
 llm = OpenAI(
-    client=openai_client,
     model=settings.default_llm,
     temperature=settings.llm_temperature,
-    max_retries=settings.openai_max_retries,
+    max_retries=max_retries,
+    timeout=settings.llm_timeout,
+    openai_client=openai_client,
+    async_openai_client=async_openai_client,
 )
+
+T = TypeVar("T")
+
+_event_loop: asyncio.AbstractEventLoop | None = None
+
+
+def start_event_loop() -> asyncio.AbstractEventLoop:
+    """Create this process's persistent event loop; called when a worker process starts."""
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_event_loop)
+    return _event_loop
+
+
+def run_async(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion on this process's persistent event loop."""
+    return start_event_loop().run_until_complete(coroutine)
+
+
+def close_clients() -> None:
+    """Close the pooled clients and the event loop; called when a worker process shuts down."""
+    global _event_loop
+    http_client.close()
+    if _event_loop is not None and not _event_loop.is_closed():
+        _event_loop.run_until_complete(async_http_client.aclose())
+        _event_loop.run_until_complete(_event_loop.shutdown_asyncgens())
+        _event_loop.close()
+    _event_loop = None
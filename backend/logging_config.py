@@ -1,11 +1,52 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+from datetime import UTC, datetime
+from functools import lru_cache
 
 import psutil
 from colorlog import ColoredFormatter
 
 from .config import settings
 
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log aggregators."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+
+    return ColoredFormatter(
+        "%(log_color)s%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        log_colors={
+            "DEBUG": "cyan",
+            "INFO": "green",
+            "WARNING": "yellow",
+            "ERROR": "red",
+            "CRITICAL": "bold_red",
+        },
+    )
+
+
 root_logger = logging.getLogger()
 root_logger.setLevel(logging.INFO)
 
@@ -14,20 +55,39 @@ for handler in root_logger.handlers:
 
 handler = logging.StreamHandler()
 handler.setLevel(logging.DEBUG)
+handler.setFormatter(_build_formatter())
+
+queue_listener: logging.handlers.QueueListener | None = None
+
+
+def _start_queue_listener() -> None:
+    """Route records through a queue so formatting and writes happen on a background thread, not the caller's."""
+    global queue_listener
 
-formatter = ColoredFormatter(
-    "%(log_color)s%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    log_colors={
-        "DEBUG": "cyan",
-        "INFO": "green",
-        "WARNING": "yellow",
-        "ERROR": "red",
-        "CRITICAL": "bold_red",
-    },
-)
-handler.setFormatter(formatter)
-root_logger.addHandler(handler)
+    log_queue = queue.SimpleQueue()
+    for existing_handler in list(root_logger.handlers):
+        root_logger.removeHandler(existing_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    queue_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    queue_listener.start()
+
+
+def stop_queue_listener() -> None:
+    global queue_listener
+
+    if queue_listener is not None:
+        queue_listener.stop()
+        queue_listener = None
+
+
+if settings.log_async:
+    _start_queue_listener()
+    atexit.register(stop_queue_listener)
+    # The listener thread does not survive a fork, so forked workers start their own
+    os.register_at_fork(after_in_child=_start_queue_listener)
+else:
+    root_logger.addHandler(handler)
 
 logger = logging.getLogger("rails_superhero_cards")
 logger.setLevel(settings.log_level)
@@ -39,11 +99,25 @@ logging.getLogger("PIL").setLevel(logging.WARNING)
 logging.getLogger("llama_index_instrumentation").setLevel(logging.WARNING)
 
 
+@lru_cache(maxsize=1)
+def _get_process(pid: int) -> psutil.Process:
+    return psutil.Process(pid)
+
+
+@lru_cache(maxsize=1)
+def _total_memory() -> int:
+    return psutil.virtual_memory().total
+
+
 def log_memory_usage(label: str = "") -> None:
-    process = psutil.Process(os.getpid())
-    mem_info = process.memory_info()
+    if not logger.isEnabledFor(logging.INFO) or random.random() >= settings.log_memory_sample_rate:
+        return
+
+    mem_info = _get_process(os.getpid()).memory_info()
     logger.info(
-        f"Memory [{label}] - RSS: {mem_info.rss / 1024 / 1024:.2f}MB, "
-        f"VMS: {mem_info.vms / 1024 / 1024:.2f}MB, "
-        f"Percent: {process.memory_percent():.1f}%"
+        "Memory [%s] - RSS: %.2fMB, VMS: %.2fMB, Percent: %.1f%%",
+        label,
+        mem_info.rss / 1024 / 1024,
+        mem_info.vms / 1024 / 1024,
+        mem_info.rss / _total_memory() * 100,
     )
@@ -1,34 +1,81 @@
+import contextlib
+import hmac
+import math
 from pathlib import Path
 
 import sentry_sdk
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, Response
-from fastapi.staticfiles import StaticFiles
-from langfuse import Langfuse
-from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .api import router
 from .config import settings
 from .dependencies import lifespan
-from .exceptions import ImageFormatError, ImageSizeError, InputValidationError
+from .exceptions import ImageFormatError, ImageSizeError, InputValidationError, RateLimitExceededError
+from .metrics import metrics_registry
+from .static_files import SpaStaticFiles
 
 
-class LimitUploadSize(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI, max_upload_size: int):
-        super().__init__(app)
+class UploadTooLargeError(Exception):
+    pass
+
+
+class LimitUploadSize:
+    """Reject request bodies over ``max_upload_size`` with a 413, counting bytes as they arrive.
+
+    Bodies that declare a larger ``Content-Length`` are rejected before they are read; chunked bodies are cut off as
+    soon as they pass the limit. A pure ASGI middleware, so it adds nothing to streaming responses.
+    """
+
+    def __init__(self, app: ASGIApp, max_upload_size: int):
+        self.app = app
         self.max_upload_size = max_upload_size
 
-    async def dispatch(self, request: Request, call_next) -> Response:  # noqa: ANN001
-        if request.method == "POST":
-            content_length = request.headers.get("content-length")
-            if content_length and int(content_length) > self.max_upload_size:
-                return JSONResponse(
-                    status_code=400,
-                    content={"error": "Image too large. Maximum size is 4MB."},
-                )
-        return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_upload_size:
+            await self.too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_upload_size:
+                    exceeded = True
+                    raise UploadTooLargeError
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            # The app's own response to the aborted body (usually a 400 for an unparseable form) is replaced below
+            if exceeded:
+                return
+            response_started = True
+            await send(message)
+
+        with contextlib.suppress(UploadTooLargeError):
+            await self.app(scope, limited_receive, guarded_send)
+
+        if exceeded and not response_started:
+            await self.too_large(scope, receive, send)
+
+    @staticmethod
+    async def too_large(scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(status_code=413, content={"error": "Image too large. Maximum size is 4MB."})
+        await response(scope, receive, send)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -46,18 +93,30 @@ app.add_middleware(
 
 app.include_router(router, prefix="/api")
 
-frontend_build_path = Path(__file__).parent.parent / "frontend" / "dist"
 
-if frontend_build_path.exists():
-    app.mount("/assets", StaticFiles(directory=frontend_build_path / "assets"), name="assets")
+@app.exception_handler(RateLimitExceededError)
+async def rate_limit_exceeded(_: Request, error: RateLimitExceededError) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Too many cards requested. Please wait a moment and try again."},
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
+
 
-    @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str) -> FileResponse:
-        file_path = frontend_build_path / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str | None = Header(None)) -> Response:
+    expected = f"Bearer {settings.metrics_token}"
+    if not settings.metrics_token or not hmac.compare_digest(authorization or "", expected):
+        raise HTTPException(status_code=404)
 
-        return FileResponse(frontend_build_path / "index.html")
+    return Response(content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+frontend_build_path = Path(__file__).parent.parent / "frontend" / "dist"
+
+# Mounted last so the API and metrics routes take precedence
+if frontend_build_path.exists():
+    app.mount("/", SpaStaticFiles(frontend_build_path), name="frontend")
 
 
 if settings.environment == "production":
@@ -66,11 +125,3 @@ if settings.environment == "production":
         enable_tracing=settings.sentry_enable_tracing,
         ignore_errors=[InputValidationError, ImageFormatError, ImageSizeError],
     )
-
-if settings.enable_langfuse:
-    langfuse = Langfuse(
-        host=settings.langfuse_base_url,
-        public_key=settings.langfuse_public_key,
-        secret_key=settings.langfuse_secret_key,
-    )
-    LlamaIndexInstrumentor().instrument()
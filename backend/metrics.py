@@ -0,0 +1,135 @@
+"""Prometheus metrics shared by the web app and the workers.
+
+Celery's prefork children each hold their own values, so workers must run with ``PROMETHEUS_MULTIPROC_DIR`` pointing at
+an empty directory for the exporter in the main process to aggregate them.
+"""
+
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0)
+
+stage_duration = Histogram(
+    "card_stage_duration_seconds",
+    "Time spent in each stage of card generation.",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+card_jobs = Counter(
+    "card_jobs",
+    "Card generation jobs by outcome (complete, invalid_input, failed).",
+    ["outcome"],
+)
+jobs_in_flight = Gauge(
+    "card_jobs_in_flight",
+    "Card generation jobs currently running on the workers.",
+    multiprocess_mode="livesum",
+)
+sse_active_streams = Gauge(
+    "sse_active_streams",
+    "Open SSE streams on the web app.",
+    multiprocess_mode="livesum",
+)
+sse_events_delivered = Counter(
+    "sse_events_delivered",
+    "Events delivered to SSE clients by type.",
+    ["type"],
+)
+websocket_active_streams = Gauge(
+    "websocket_active_streams",
+    "Open card WebSocket streams on the web app.",
+    multiprocess_mode="livesum",
+)
+websocket_events_delivered = Counter(
+    "websocket_events_delivered",
+    "Events delivered to WebSocket clients by type.",
+    ["type"],
+)
+
+retention_deleted = Counter(
+    "card_retention_deleted",
+    "Expired cards removed by the retention job.",
+    ["target"],
+)
+retention_failed = Counter(
+    "card_retention_failed",
+    "Expired card objects the retention job failed to delete from S3.",
+)
+retention_last_run = Gauge(
+    "card_retention_last_run_timestamp_seconds",
+    "Unix time the retention job last completed.",
+    multiprocess_mode="max",
+)
+
+validation_cache_requests = Counter(
+    "validation_cache_requests",
+    "Validation cache lookups by result (local_hit, redis_hit, miss).",
+    ["result"],
+)
+
+prefilter_verdicts = Counter(
+    "prefilter_verdicts",
+    "Local pre-validation verdicts; accept and reject verdicts are LLM calls avoided.",
+    ["rules", "verdict"],
+)
+
+llm_validation_duration = Histogram(
+    "llm_validation_duration_seconds",
+    "Time from workflow start until the input is both validated and named, by validation mode.",
+    ["mode"],
+)
+llm_validation_verdicts = Counter(
+    "llm_validation_verdicts",
+    "Input validation outcomes by validation mode.",
+    ["mode", "verdict"],
+)
+
+trace_media_exports = Counter(
+    "trace_media_exports",
+    "Card images submitted for Langfuse export by result (exported, sampled_out, dropped, failed).",
+    ["result"],
+)
+
+result_cache_requests = Counter(
+    "result_cache_requests",
+    "Result cache lookups for card submissions by result (hit, miss, stale, failed).",
+    ["result"],
+)
+
+rate_limit_rejections = Counter(
+    "rate_limit_rejections",
+    "Requests rejected by the rate limiter by budget and where the check was decided (local or redis).",
+    ["budget", "source"],
+)
+
+openai_concurrency_limit = Gauge(
+    "openai_concurrency_limit",
+    "Current shared concurrency limit for OpenAI calls by pool (image, llm).",
+    ["pool"],
+    multiprocess_mode="mostrecent",
+)
+openai_calls_in_flight = Gauge(
+    "openai_calls_in_flight",
+    "OpenAI calls holding a concurrency limiter slot by pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port: int) -> None:
+    start_http_server(port, registry=metrics_registry())
+
+
+def mark_process_dead(pid: int) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,34 @@
+"""add_cards_indexes
+
+Revision ID: 3f9c2b7d1e84
+Revises: 71ce061752e3
+Create Date: 2026-10-18 09:41:27.318512
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2b7d1e84"
+down_revision: Union[str, Sequence[str], None] = "71ce061752e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build the indexes concurrently so the cards table stays writable during the migration
+    with op.get_context().autocommit_block():
+        op.create_index("ix_cards_created_at", "cards", ["created_at"], postgresql_concurrently=True)
+        op.create_index("ix_cards_theme_created_at", "cards", ["theme", "created_at"], postgresql_concurrently=True)
+        op.create_index("ix_cards_status_created_at", "cards", ["status", "created_at"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_cards_status_created_at", table_name="cards", postgresql_concurrently=True)
+        op.drop_index("ix_cards_theme_created_at", table_name="cards", postgresql_concurrently=True)
+        op.drop_index("ix_cards_created_at", table_name="cards", postgresql_concurrently=True)
@@ -2,7 +2,7 @@ from datetime import datetime
 from enum import StrEnum
 from uuid import UUID, uuid4
 
-from sqlalchemy import Column, Enum, func
+from sqlalchemy import Column, Enum, Index, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -17,6 +17,11 @@ class CardTheme(StrEnum):
 
 class Card(Base):
     __tablename__ = "cards"
+    __table_args__ = (
+        Index("ix_cards_created_at", "created_at"),
+        Index("ix_cards_theme_created_at", "theme", "created_at"),
+        Index("ix_cards_status_created_at", "status", "created_at"),
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     session_id: Mapped[str] = mapped_column(unique=True, nullable=False)
@@ -0,0 +1,116 @@
+"""Cheap local checks run in front of the LLM input validator.
+
+Obvious cases are settled in microseconds: empty, oversized or prompt-injection inputs are rejected, and plain ASCII
+inputs made up entirely of known-good vocabulary are accepted. Everything else is ambiguous and goes to the LLM.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date
+from enum import StrEnum
+
+from .config import settings
+from .metrics import prefilter_verdicts
+
+INJECTION_PATTERN = re.compile(
+    r"""
+    ignore\s+(all\s+|any\s+|the\s+)?(previous|prior|above|earlier)\s+(instructions|prompts?|rules)
+    | disregard\s+(all\s+|any\s+|the\s+)?(previous|prior|above|earlier)
+    | forget\s+(all\s+|your\s+)?(previous\s+)?instructions
+    | \bsystem\s*:
+    | \bassistant\s*:
+    | you\s+are\s+now\b
+    | </?\s*(user_input|description|system)\s*>
+    | \bjailbreak
+    | \bdeveloper\s+mode\b
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+NO_WORDS_PATTERN = re.compile(r"^[\W_]*$")
+TOKEN_PATTERN = re.compile(r"[a-z0-9#+.'-]+")
+# Only input made entirely of these can be accepted; tokenizing drops anything else, like other scripts or emoji
+ACCEPT_CHARACTERS_PATTERN = re.compile(r"[a-z0-9#+.'\-\s,/&!]+", re.IGNORECASE | re.ASCII)
+
+CONNECTORS = frozenset({"a", "an", "and", "&", "i", "im", "i'm", "in", "of", "on", "the", "to", "with", "at"})
+
+TECH_VOCABULARY = CONNECTORS | frozenset(
+    {
+        "rails", "ruby", "ror", "developer", "dev", "engineer", "engineering", "programmer", "coder", "coding",
+        "software", "backend", "back-end", "frontend", "front-end", "fullstack", "full-stack", "full", "stack",
+        "devops", "sre", "ops", "infrastructure", "cloud", "aws", "docker", "kubernetes", "k8s", "api", "apis",
+        "javascript", "typescript", "react", "hotwire", "turbo", "stimulus", "sql", "postgres", "postgresql",
+        "mysql", "redis", "sidekiq", "rspec", "minitest", "testing", "tester", "qa", "quality", "assurance",
+        "performance", "optimization", "upgrades", "upgrade", "security", "debugging", "refactoring", "design",
+        "designer", "ux", "ui", "product", "project", "manager", "management", "lead", "leader", "tech",
+        "technical", "architect", "architecture", "cto", "ceo", "founder", "consultant", "senior", "junior",
+        "staff", "principal", "web", "mobile", "data", "scientist", "analyst", "support", "operations", "admin",
+        "python", "go", "rust", "java", "elixir", "node", "ci", "cd", "git", "github", "open", "source",
+    }
+)  # fmt: skip
+
+# This year and the next, since New Year cards are made in December too
+GREETING_YEARS = frozenset(str(date.today().year + offset) for offset in (0, 1))
+
+HOLIDAY_VOCABULARY = CONNECTORS | frozenset(
+    {
+        "happy", "new", "year", "years", "year's", "cheers", "best", "wishes", "warm", "season's",
+        "greetings", "all", "everyone", "you", "your", "family", "friends", "team", "prosperous", "healthy",
+        "joyful", "bright", "great", "amazing", "wonderful", "peace", "love", "joy", "success", "health",
+        "happiness", "celebrate", "celebrating", "party", "for", "from", "us", "our", "my", "fastruby", "ombulabs",
+    }
+) | GREETING_YEARS  # fmt: skip
+
+
+class Verdict(StrEnum):
+    ACCEPT = "accept"
+    REJECT = "reject"
+    AMBIGUOUS = "ambiguous"
+
+
+@dataclass(frozen=True)
+class PrefilterRules:
+    name: str
+    vocabulary: frozenset[str]
+    # Shown to the user when the input is rejected, whether here or by the LLM validator
+    invalid_message: str
+    max_length: int = settings.input_max_length
+    max_accept_tokens: int = 12
+
+
+SUPERHERO_RULES = PrefilterRules(
+    name="superhero",
+    vocabulary=TECH_VOCABULARY,
+    invalid_message="Sorry, we cannot generate a card with the added instructions. Please add relevant skills.",
+)
+HOLIDAY_RULES = PrefilterRules(
+    name="holiday",
+    vocabulary=HOLIDAY_VOCABULARY,
+    invalid_message="Sorry, we cannot generate a card with that message. Please enter an appropriate message",
+)
+
+
+def prefilter(text: str, rules: PrefilterRules) -> Verdict:
+    verdict = _classify(text, rules)
+    prefilter_verdicts.labels(rules=rules.name, verdict=verdict).inc()
+    return verdict
+
+
+def _classify(text: str, rules: PrefilterRules) -> Verdict:
+    if not text or NO_WORDS_PATTERN.match(text):
+        return Verdict.REJECT
+
+    if len(text) > rules.max_length or INJECTION_PATTERN.search(text):
+        return Verdict.REJECT
+
+    tokens = [token.strip(".'-") for token in TOKEN_PATTERN.findall(text.lower().replace("/", " "))]
+    tokens = [token for token in tokens if token]
+    # Connectors are in every vocabulary, so input made only of them ("the", "of the") is left to the LLM
+    if (
+        ACCEPT_CHARACTERS_PATTERN.fullmatch(text)
+        and len(tokens) <= rules.max_accept_tokens
+        and any(token not in CONNECTORS for token in tokens)
+        and all(token in rules.vocabulary for token in tokens)
+    ):
+        return Verdict.ACCEPT
+
+    return Verdict.AMBIGUOUS
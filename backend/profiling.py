@@ -0,0 +1,129 @@
+"""Opt-in cProfile profiling of card generation tasks and upload preprocessing.
+
+A run is profiled when ``profiling_enabled`` is on, for a ``profiling_sample_rate`` fraction of runs, or when the
+request sends an ``X-Profile`` header matching ``profiling_token``. Profiles are saved as ``.prof`` files (readable with
+``pstats`` or snakeviz) named after the session, either in ``profiling_dir`` or under ``s3_profiles_folder_prefix``.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import pstats
+import random
+import re
+import tempfile
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from pathlib import Path
+
+from .config import settings
+from .logging_config import logger
+
+_current_profiler: ContextVar[cProfile.Profile | None] = ContextVar("current_profiler", default=None)
+
+
+def is_profile_requested(header_value: str | None) -> bool:
+    if not settings.profiling_token or not header_value:
+        return False
+
+    return hmac.compare_digest(header_value, settings.profiling_token)
+
+
+def should_profile(requested: bool = False) -> bool:
+    return settings.profiling_enabled or requested or random.random() < settings.profiling_sample_rate  # noqa: S311
+
+
+@contextmanager
+def profile(session_id: str, name: str, enabled: bool) -> Iterator[None]:
+    """Profile the block when ``enabled`` and save the result tagged with ``session_id``."""
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    token = _current_profiler.set(profiler)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _current_profiler.reset(token)
+        _save_or_log(profiler, session_id=session_id, name=name)
+
+
+@asynccontextmanager
+async def profile_async(session_id: str, name: str, enabled: bool) -> AsyncIterator[None]:
+    """Like ``profile`` for request handlers; the profile is saved on a thread so the event loop is not blocked."""
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        await asyncio.to_thread(_save_or_log, profiler, session_id=session_id, name=name)
+
+
+def _save_or_log(profiler: cProfile.Profile, session_id: str, name: str) -> None:
+    try:
+        save_profile(profiler, session_id=session_id, name=name)
+    except Exception as error:
+        logger.error(f"Failed to save {name} profile for session {session_id}: {error}")
+
+
+def summarize(profiler: cProfile.Profile, limit: int = 10) -> dict:
+    stats = pstats.Stats(profiler)
+
+    def top(sort_index: int) -> list[dict]:
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][sort_index], reverse=True)[:limit]
+        return [
+            {
+                "function": pstats.func_std_string(function),
+                "calls": calls,
+                "totalSeconds": round(total_time, 4),
+                "cumulativeSeconds": round(cumulative_time, 4),
+            }
+            for function, (_, calls, total_time, cumulative_time, _) in entries
+        ]
+
+    return {"totalSeconds": round(stats.total_tt, 4), "topCumulative": top(3), "topTotal": top(2)}
+
+
+def current_profile_summary(limit: int = 10) -> dict | None:
+    """Summarize the profile of the running task so far, or return None if it is not being profiled."""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return None
+
+    # Building stats disables the profiler, so switch it back on afterwards
+    summary = summarize(profiler, limit)
+    profiler.enable()
+    return summary
+
+
+def save_profile(profiler: cProfile.Profile, session_id: str, name: str) -> str:
+    # Session ids come from the client, so keep them from adding path segments to the file name or S3 key
+    safe_session_id = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:64]
+    file_name = f"{datetime.now(tz=UTC).strftime('%Y%m%d_%H%M%S')}_{name}_{safe_session_id}.prof"
+
+    if settings.profiling_output == "s3":
+        from .aws_service import S3Service
+
+        with tempfile.NamedTemporaryFile(suffix=".prof") as profile_file:
+            profiler.dump_stats(profile_file.name)
+            location = S3Service(folder_prefix=settings.s3_profiles_folder_prefix).upload_bytes(
+                data=Path(profile_file.name).read_bytes(), file_name=file_name
+            )
+    else:
+        profile_path = Path(settings.profiling_dir) / file_name
+        profile_path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile_path)
+        location = str(profile_path)
+
+    logger.info(f"Saved {name} profile for session {session_id} to {location}")
+    return location
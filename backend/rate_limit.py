@@ -0,0 +1,177 @@
+"""Token-bucket rate limiting for card submissions.
+
+Every submission is charged against several budgets at once: the client IP, the session, all traffic, and optionally
+the image spend per minute (charged at ``price_per_image``). The session budget is best-effort: the client picks its
+session id, so it only slows down well-behaved clients resubmitting from one page. The check runs as one Lua script
+so a request either consumes from every budget or from none.
+
+Each process keeps a local copy of the buckets, charged only for requests Redis allowed. Since Redis also sees other
+processes' requests, a local bucket is never emptier than the shared one, so a request the local bucket rejects is
+rejected without a Redis round trip. If Redis is unavailable the limiter falls back to the local buckets alone.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fastapi import Form, Request
+from redis.asyncio import Redis
+
+from .config import settings
+from .dependencies import get_async_redis_client
+from .exceptions import RateLimitExceededError
+from .logging_config import logger
+from .metrics import rate_limit_rejections
+
+# KEYS are the buckets; ARGV holds capacity, refill per second and cost for each bucket in turn.
+# Returns {0} when every bucket had enough tokens, else {index of the slowest bucket, seconds until it refills}.
+CHARGE_BUCKETS_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local slowest, wait = 0, 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local cost = tonumber(ARGV[i * 3])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens[i] = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+    if tokens[i] < cost and (cost - tokens[i]) / rate > wait then
+        slowest, wait = i, (cost - tokens[i]) / rate
+    end
+end
+
+if slowest > 0 then
+    return {slowest, tostring(wait)}
+end
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    redis.call('HSET', key, 'tokens', tokens[i] - tonumber(ARGV[i * 3]), 'updated_at', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {0}
+"""
+
+
+@dataclass(frozen=True)
+class Budget:
+    name: str
+    key: str
+    capacity: float
+    refill_per_second: float
+    cost: float = 1.0
+
+
+class LocalTokenBuckets:
+    """In-process token buckets, bounded to the most recently used keys."""
+
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def _tokens(self, budget: Budget, now: float) -> float:
+        tokens, updated_at = self._buckets.get(budget.key, (budget.capacity, now))
+        return min(budget.capacity, tokens + (now - updated_at) * budget.refill_per_second)
+
+    def wait_time(self, budgets: list[Budget]) -> tuple[Budget | None, float]:
+        """Return the budget that is furthest from allowing the request and how long it needs, if any."""
+        now = time.monotonic()
+        slowest, wait = None, 0.0
+        for budget in budgets:
+            missing = budget.cost - self._tokens(budget, now)
+            if missing > 0 and missing / budget.refill_per_second > wait:
+                slowest, wait = budget, missing / budget.refill_per_second
+        return slowest, wait
+
+    def consume(self, budgets: list[Budget]) -> None:
+        now = time.monotonic()
+        for budget in budgets:
+            self._buckets[budget.key] = (max(self._tokens(budget, now) - budget.cost, 0.0), now)
+            self._buckets.move_to_end(budget.key)
+
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class RateLimiter:
+    def __init__(self, redis_client: Redis, prefix: str = "rate_limit"):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.local = LocalTokenBuckets()
+        self._script = redis_client.register_script(CHARGE_BUCKETS_SCRIPT)
+
+    async def hit(self, budgets: list[Budget]) -> None:
+        """Charge the request to every budget, or raise ``RateLimitExceededError`` without charging any."""
+        budget, wait = self.local.wait_time(budgets)
+        if budget:
+            rate_limit_rejections.labels(budget=budget.name, source="local").inc()
+            raise RateLimitExceededError(budget.name, wait)
+
+        keys = [f"{self.prefix}:{budget.key}" for budget in budgets]
+        args = [value for budget in budgets for value in (budget.capacity, budget.refill_per_second, budget.cost)]
+        try:
+            result = await self._script(keys=keys, args=args)
+        except Exception as error:
+            logger.warning(f"Rate limit check failed, using local limits only: {error}")
+            result = [0]
+
+        if int(result[0]):
+            budget = budgets[int(result[0]) - 1]
+            rate_limit_rejections.labels(budget=budget.name, source="redis").inc()
+            raise RateLimitExceededError(budget.name, float(result[1]))
+
+        self.local.consume(budgets)
+
+
+def client_ip(request: Request) -> str:
+    """The address seen by the outermost of ``trusted_proxy_count`` proxies, otherwise the peer address.
+
+    Each proxy appends the address it received the request from to ``X-Forwarded-For``, so only entries counted from
+    the end can be trusted; anything before them was sent by the client.
+    """
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if settings.trusted_proxy_count and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",") if address.strip()]
+        if addresses:
+            return addresses[-min(settings.trusted_proxy_count, len(addresses))]
+
+    return request.client.host if request.client else "unknown"
+
+
+def card_budgets(ip: str, session_id: str) -> list[Budget]:
+    def per_window(name: str, key: str, limit: int, window: float) -> Budget:
+        return Budget(name=name, key=key, capacity=limit, refill_per_second=limit / window)
+
+    budgets = [
+        per_window("ip", f"ip:{ip}", settings.rate_limit_ip, settings.rate_limit_ip_window),
+        per_window("session", f"session:{session_id}", settings.rate_limit_session, settings.rate_limit_session_window),
+        per_window("global", "global", settings.rate_limit_global, settings.rate_limit_global_window),
+    ]
+    if settings.max_spend_per_minute:
+        budgets.append(
+            Budget(
+                name="spend",
+                key="spend",
+                capacity=settings.max_spend_per_minute,
+                refill_per_second=settings.max_spend_per_minute / 60,
+                cost=settings.price_per_image,
+            )
+        )
+    return budgets
+
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(redis_client=get_async_redis_client())
+
+
+async def limit_card_submissions(request: Request, session_id: str = Form(...)) -> None:
+    """Dependency for the card submission route."""
+    if settings.rate_limit_enabled:
+        await get_rate_limiter().hit(card_budgets(client_ip(request), session_id))
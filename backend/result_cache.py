@@ -0,0 +1,89 @@
+"""Reuse of finished cards for repeated submissions of the same photo, text and theme.
+
+The key hashes the compressed upload, the whitespace-normalised text, the theme and a fingerprint of everything that
+shapes the output (models, card layout and ``RESULT_CACHE_VERSION``), and maps to the S3 object of the card generated
+for it. The web process looks it up before enqueueing; the worker stores it once a card is in S3. With
+``result_cache_max_reuses`` set, an entry is dropped after that many reuses so the next submission generates afresh.
+"""
+
+import hashlib
+import json
+
+from .config import settings
+from .dependencies import get_async_redis_client, get_redis_client
+from .logging_config import logger
+from .metrics import result_cache_requests
+
+# Bump when the prompts or card rendering change so earlier cards are no longer reused
+RESULT_CACHE_VERSION = 1
+
+# Returns the cached object key and counts the reuse, or drops the entry once it has been reused too often
+REUSE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local reuses = redis.call('HINCRBY', KEYS[1], 'reuses', 1)
+local max_reuses = tonumber(ARGV[1])
+if max_reuses > 0 and reuses > max_reuses then
+    redis.call('DEL', KEYS[1])
+    return false
+end
+return redis.call('HGET', KEYS[1], 'object_key')
+"""
+
+
+def pipeline_fingerprint() -> str:
+    return json.dumps(
+        [
+            RESULT_CACHE_VERSION,
+            settings.image_gen_model,
+            settings.default_llm,
+            settings.generated_image_size,
+            settings.card_border_size,
+            settings.card_title_area_height,
+            settings.card_font_size,
+            settings.card_branding_area_height,
+        ]
+    )
+
+
+def result_cache_key(image_data: bytes, text: str, holiday_theme: bool) -> str:
+    theme = "holiday" if holiday_theme else "superhero"
+    digest = hashlib.sha256("\0".join([pipeline_fingerprint(), theme, " ".join(text.split())]).encode())
+    digest.update(hashlib.sha256(image_data).digest())
+    return f"result_cache:{digest.hexdigest()}"
+
+
+async def reuse_result(key: str) -> str | None:
+    """Return the S3 object key of the cached card for ``key``, counting it as reused.
+
+    Only misses are recorded here; the caller records whether a hit could actually be served.
+    """
+    try:
+        redis_client = get_async_redis_client()
+        object_key = await redis_client.eval(REUSE_SCRIPT, 1, key, settings.result_cache_max_reuses or 0)
+    except Exception as error:
+        logger.warning(f"Result cache lookup failed: {error}")
+        object_key = None
+
+    if not object_key:
+        result_cache_requests.labels(result="miss").inc()
+    return object_key.decode() if isinstance(object_key, bytes) else object_key
+
+
+async def forget_result(key: str) -> None:
+    try:
+        await get_async_redis_client().delete(key)
+    except Exception as error:
+        logger.warning(f"Result cache delete failed: {error}")
+
+
+def store_result(key: str, object_key: str) -> None:
+    try:
+        redis_client = get_redis_client()
+        with redis_client.pipeline() as pipeline:
+            pipeline.hset(key, mapping={"object_key": object_key, "reuses": 0})
+            pipeline.expire(key, settings.result_cache_ttl)
+            pipeline.execute()
+    except Exception as error:
+        logger.warning(f"Result cache store failed: {error}")
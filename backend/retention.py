@@ -0,0 +1,94 @@
+"""Bulk clean-up of expired cards from S3 and Postgres."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, select, tuple_
+
+from .aws_service import S3_DELETE_BATCH_SIZE, S3Service
+from .config import settings
+from .db import get_session
+from .logging_config import logger
+from .metrics import retention_deleted, retention_failed, retention_last_run
+from .models import Card
+
+
+def retention_cutoff(retention_days: int) -> datetime:
+    # created_at is stored as a naive UTC timestamp
+    return datetime.now(tz=UTC).replace(tzinfo=None) - timedelta(days=retention_days)
+
+
+def _delete_from_s3(s3_service: S3Service, object_keys: list[str], concurrency: int) -> set[str]:
+    """Delete keys in DeleteObjects-sized batches, returning the keys that could not be removed."""
+    batches = [object_keys[i : i + S3_DELETE_BATCH_SIZE] for i in range(0, len(object_keys), S3_DELETE_BATCH_SIZE)]
+
+    def delete_batch(batch: list[str]) -> list[str]:
+        try:
+            _, failed_keys = s3_service.delete_objects(batch)
+        except Exception:
+            return batch
+        return failed_keys
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return {key for failed_keys in executor.map(delete_batch, batches) for key in failed_keys}
+
+
+def purge_expired_cards(
+    cutoff: datetime,
+    s3_service: S3Service | None = None,
+    page_size: int = settings.card_retention_page_size,
+    concurrency: int = settings.card_retention_concurrency,
+) -> dict:
+    """Delete cards created before ``cutoff`` along with their S3 objects.
+
+    Cards are paged by ``(created_at, id)`` so a page whose objects fail to delete is skipped rather than retried in a
+    loop. A row is only removed once its object is gone from S3, so failures are picked up again on the next run.
+
+    Args:
+        cutoff: Cards created strictly before this naive UTC timestamp are removed.
+        s3_service: S3 client to delete objects with. Pass one pointed at a stand-in (moto, LocalStack) in tests.
+        page_size: Number of rows selected per page.
+        concurrency: Maximum number of concurrent DeleteObjects requests.
+
+    Returns:
+        Counts of deleted rows, deleted objects and objects that failed to delete.
+    """
+    s3_service = s3_service or S3Service()
+    totals = {"rows_deleted": 0, "objects_deleted": 0, "objects_failed": 0}
+    last_seen = None
+
+    while True:
+        query = select(Card.id, Card.created_at, Card.aws_object_key).where(Card.created_at < cutoff)
+        if last_seen:
+            query = query.where(tuple_(Card.created_at, Card.id) > last_seen)
+        query = query.order_by(Card.created_at, Card.id).limit(page_size)
+
+        with get_session() as session:
+            rows = session.execute(query).all()
+        if not rows:
+            break
+        last_seen = (rows[-1].created_at, rows[-1].id)
+
+        object_keys = [row.aws_object_key for row in rows if row.aws_object_key]
+        failed_keys = _delete_from_s3(s3_service, object_keys, concurrency) if object_keys else set()
+
+        card_ids = [row.id for row in rows if row.aws_object_key not in failed_keys]
+        if card_ids:
+            with get_session() as session:
+                session.execute(delete(Card).where(Card.id.in_(card_ids)))
+
+        totals["rows_deleted"] += len(card_ids)
+        totals["objects_deleted"] += len(object_keys) - len(failed_keys)
+        totals["objects_failed"] += len(failed_keys)
+        retention_deleted.labels(target="db").inc(len(card_ids))
+        retention_deleted.labels(target="s3").inc(len(object_keys) - len(failed_keys))
+        retention_failed.inc(len(failed_keys))
+
+        logger.info(
+            f"Retention progress: {totals['rows_deleted']} rows, {totals['objects_deleted']} objects deleted, "
+            f"{totals['objects_failed']} objects failed"
+        )
+
+    retention_last_run.set(time.time())
+    return totals
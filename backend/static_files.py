@@ -0,0 +1,138 @@
+"""Static serving for the built frontend.
+
+``frontend/dist`` is indexed once at startup, so a request is a dictionary lookup: no filesystem checks or FastAPI
+routing. Hashed Vite assets under ``assets/`` are cached for a year as immutable; everything else, including the
+``index.html`` fallback for client-side routes, is revalidated with its ETag and answered with 304 when unchanged.
+The ``.br`` and ``.gz`` files written next to each asset by the frontend build are served to clients that accept them.
+"""
+
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from .logging_config import logger
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred first when a client accepts several
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+@dataclass(frozen=True)
+class StaticVariant:
+    path: Path
+    stat_result: os.stat_result
+    etag: str
+
+
+@dataclass(frozen=True)
+class StaticFile:
+    media_type: str
+    cache_control: str
+    identity: StaticVariant
+    encoded: dict[str, StaticVariant] = field(default_factory=dict)
+
+
+def _variant(path: Path, digest: str, suffix: str = "") -> StaticVariant:
+    return StaticVariant(path=path, stat_result=path.stat(), etag=f'"{digest}{suffix}"')
+
+
+def index_directory(directory: Path) -> dict[str, StaticFile]:
+    """Map each file's URL path (without the leading slash) to its variants and headers."""
+    files = {}
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or path.suffix in (".br", ".gz"):
+            continue
+
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()[:32]
+        encoded = {}
+        for encoding, suffix in ENCODINGS.items():
+            encoded_path = path.with_name(path.name + suffix)
+            if encoded_path.is_file():
+                encoded[encoding] = _variant(encoded_path, digest, f"-{encoding}")
+
+        url_path = path.relative_to(directory).as_posix()
+        files[url_path] = StaticFile(
+            media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            cache_control=IMMUTABLE_CACHE_CONTROL if url_path.startswith("assets/") else REVALIDATE_CACHE_CONTROL,
+            identity=_variant(path, digest),
+            encoded=encoded,
+        )
+    return files
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Encodings named in an ``Accept-Encoding`` header, leaving out any refused with ``q=0``."""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        encoding, _, params = part.partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            pass
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class SpaStaticFiles:
+    """ASGI app serving the indexed build, falling back to ``index.html`` for client-side routes."""
+
+    def __init__(self, directory: Path):
+        self.files = index_directory(directory)
+        self.index = self.files.get("index.html")
+        logger.info(f"Indexed {len(self.files)} frontend files from {directory}")
+
+    def lookup(self, url_path: str) -> StaticFile | None:
+        static_file = self.files.get(url_path.lstrip("/"))
+        if static_file or url_path.startswith("/assets/"):
+            return static_file
+        return self.index
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1000})
+            return
+
+        if scope["method"] not in ("GET", "HEAD"):
+            await PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})(
+                scope, receive, send
+            )
+            return
+
+        static_file = self.lookup(scope["path"])
+        if static_file is None:
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        encoding = next((encoding for encoding in static_file.encoded if encoding in accepted), None)
+        variant = static_file.encoded[encoding] if encoding else static_file.identity
+
+        headers = {"cache-control": static_file.cache_control, "etag": variant.etag}
+        if static_file.encoded:
+            headers["vary"] = "Accept-Encoding"
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and variant.etag in (tag.strip() for tag in if_none_match.split(",")):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        if encoding:
+            headers["content-encoding"] = encoding
+        response = FileResponse(
+            variant.path,
+            headers=headers,
+            media_type=static_file.media_type,
+            stat_result=variant.stat_result,
+        )
+        await response(scope, receive, send)
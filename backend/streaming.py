@@ -0,0 +1,69 @@
+"""Wire format for the card events a worker publishes and the web process relays to SSE and WebSocket clients.
+
+A Redis message is a 4-byte big-endian header length, a JSON header and, for ``partial`` and ``complete`` events, the
+raw PNG. Keeping the image out of the JSON lets the WebSocket relay forward it as a binary frame untouched; only the SSE
+relay base64-encodes it, into the same ``image_base64`` field as before.
+"""
+
+import base64
+import json
+import struct
+import time
+from collections.abc import AsyncIterator
+
+from redis import Redis
+
+from .dependencies import get_async_redis_client
+
+HEADER_LENGTH = struct.Struct(">I")
+
+
+def stream_channel(session_id: str) -> str:
+    return f"image_stream:{session_id}"
+
+
+def encode_event(event: dict, image: bytes | None = None) -> bytes:
+    header = json.dumps(event).encode()
+    return HEADER_LENGTH.pack(len(header)) + header + (image or b"")
+
+
+def decode_event(message: bytes) -> tuple[dict, bytes | None]:
+    (header_length,) = HEADER_LENGTH.unpack_from(message)
+    header_end = HEADER_LENGTH.size + header_length
+    return json.loads(message[HEADER_LENGTH.size : header_end]), message[header_end:] or None
+
+
+def publish_event(redis_client: Redis, session_id: str, event: dict, image_base64: str | None = None) -> None:
+    """Publish ``event`` to the session's stream, with the card image as raw bytes if there is one."""
+    image = base64.b64decode(image_base64) if image_base64 else None
+    redis_client.publish(stream_channel(session_id), encode_event({**event, "published_at": time.time()}, image))
+
+
+def to_sse(event: dict, image: bytes | None = None) -> str:
+    if image:
+        event = {**event, "image_base64": base64.b64encode(image).decode()}
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def card_events(session_id: str, timeout: float) -> AsyncIterator[tuple[dict, bytes | None]]:
+    """Yield a ``connected`` event once subscribed, then the session's events until it completes, fails or times out."""
+    pubsub = get_async_redis_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(stream_channel(session_id))
+    try:
+        yield {"type": "connected", "session_id": session_id}, None
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(timeout=min(1.0, deadline - time.monotonic()))
+            if not message:
+                continue
+
+            event, image = decode_event(message["data"])
+            yield event, image
+            if event["type"] in ("complete", "error"):
+                return
+
+        yield {"type": "error", "message": "Timeout"}, None
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
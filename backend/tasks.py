@@ -1,24 +1,25 @@
-import asyncio
-import json
+import time
 
 import sentry_sdk
 
 from .card_generator import CardGenerator
-from .db import get_session
+from .card_writer import build_card_record, save_card
+from .config import settings
 from .dependencies import celery_app, get_redis_pubsub_client
 from .exceptions import ImageFormatError, ImageSizeError, InputValidationError
+from .llms import run_async
 from .logging_config import log_memory_usage, logger
-from .models import Card, CardTheme
+from .metrics import card_jobs, jobs_in_flight, stage_duration
+from .models import CardTheme
+from .profiling import profile, should_profile
+from .retention import purge_expired_cards, retention_cutoff
+from .streaming import publish_event
 
 
 def _publish_error_to_stream(session_id: str, error_message: str) -> None:
     try:
         redis_client = get_redis_pubsub_client()
-        channel = f"image_stream:{session_id}"
-        redis_client.publish(
-            channel,
-            json.dumps({"type": "error", "message": error_message}),
-        )
+        publish_event(redis_client, session_id, {"type": "error", "message": error_message})
         redis_client.close()
         logger.debug(f"Published error to SSE stream for session {session_id}")
     except Exception as redis_error:
@@ -29,35 +30,52 @@ def _save_error_to_db(
     session_id: str, text: str, error_message: str, error_type: str, holiday_theme: bool = False
 ) -> None:
     try:
-        with get_session() as db_session:
-            card = Card(
+        save_card(
+            build_card_record(
                 session_id=session_id,
                 text=text,
+                theme=CardTheme.HOLIDAY if holiday_theme else CardTheme.SUPERHERO,
                 status="error",
                 error_message=error_message,
-                theme=CardTheme.HOLIDAY if holiday_theme else CardTheme.SUPERHERO,
             )
-            db_session.add(card)
-            db_session.commit()
-            logger.debug(f"Saved {error_type} error to DB for session {session_id}")
+        )
+        logger.debug(f"Saved {error_type} error to DB for session {session_id}")
     except Exception as db_error:
         logger.error(f"Failed to save {error_type} error to DB: {db_error}")
 
 
 @celery_app.task(name="generate_superhero_card")
-def generate_superhero_card(session_id: str, text: str, image_data: bytes, holiday_theme: bool = False) -> dict:
+def generate_superhero_card(
+    session_id: str,
+    text: str,
+    image_data: bytes,
+    holiday_theme: bool = False,
+    enqueued_at: float | None = None,
+    profile_requested: bool = False,
+    result_cache_key: str | None = None,
+) -> dict:
     log_memory_usage("Celery task start")
+    if enqueued_at:
+        stage_duration.labels(stage="queue_wait").observe(time.time() - enqueued_at)
+
     try:
-        asyncio.run(
-            CardGenerator(
-                image_base64=image_data,
-                text=text,
-                session_id=session_id,
-                holiday_theme=holiday_theme,
-            ).generate()
-        )
+        with (
+            jobs_in_flight.track_inprogress(),
+            profile(session_id=session_id, name="task", enabled=should_profile(profile_requested)),
+        ):
+            run_async(
+                CardGenerator(
+                    image_base64=image_data,
+                    text=text,
+                    session_id=session_id,
+                    holiday_theme=holiday_theme,
+                    result_cache_key=result_cache_key,
+                ).generate()
+            )
+        card_jobs.labels(outcome="complete").inc()
         log_memory_usage("Celery task complete")
     except (InputValidationError, ImageFormatError, ImageSizeError) as error:
+        card_jobs.labels(outcome="invalid_input").inc()
         logger.warning(f"User input validation failed for session {session_id}: {type(error).__name__}: {error}")
         error_message = str(error)
         _save_error_to_db(
@@ -69,6 +87,7 @@ def generate_superhero_card(session_id: str, text: str, image_data: bytes, holid
         )
         _publish_error_to_stream(session_id=session_id, error_message=error_message)
     except Exception as error:
+        card_jobs.labels(outcome="failed").inc()
         logger.error(f"Task failed for session {session_id}: {type(error).__name__}: {error}")
         sentry_sdk.capture_exception(error)
         error_message = "Uh oh. Something went wrong... Please try again or contact us."
@@ -81,3 +100,16 @@ def generate_superhero_card(session_id: str, text: str, image_data: bytes, holid
         )
         _publish_error_to_stream(session_id=session_id, error_message=error_message)
     return {"session_id": session_id}
+
+
+@celery_app.task(name="purge_expired_cards")
+def purge_expired_cards_task() -> dict:
+    if not settings.card_retention_days:
+        logger.info("Card retention is disabled, skipping purge")
+        return {}
+
+    cutoff = retention_cutoff(settings.card_retention_days)
+    logger.info(f"Purging cards created before {cutoff.isoformat()}")
+    totals = purge_expired_cards(cutoff)
+    logger.info(f"Purged expired cards: {totals}")
+    return totals
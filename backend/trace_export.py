@@ -0,0 +1,131 @@
+"""Sampled background export of card images to Langfuse traces.
+
+Attaching the full PNG to the image generation observation copied and uploaded every card from the worker's hot path.
+Instead, the card generator submits the finished card here once it is stored, and a background thread attaches it to
+the trace as a child event: a thumbnail, the S3 reference or the full image, depending on ``langfuse_media_mode``.
+The queue is bounded and drops exports rather than blocking when it is full.
+"""
+
+import base64
+import os
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO
+
+from langfuse import get_client
+from langfuse.media import LangfuseMedia
+from PIL import Image
+
+from .config import settings
+from .logging_config import logger
+from .metrics import trace_media_exports
+
+
+@dataclass(frozen=True)
+class MediaExport:
+    trace_id: str
+    parent_observation_id: str | None
+    session_id: str
+    image_base64: str
+    object_key: str | None
+
+
+class TraceMediaExporter:
+    def __init__(self, mode: str, sample_rate: float, max_queue_size: int, thumbnail_size: int):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.max_queue_size = max_queue_size
+        self.thumbnail_size = thumbnail_size
+        self._queue: queue.Queue[MediaExport] = queue.Queue(maxsize=max_queue_size)
+        self._thread: threading.Thread | None = None
+        self._thread_pid: int | None = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, export: MediaExport) -> bool:
+        if self.mode == "none" or random.random() >= self.sample_rate:  # noqa: S311
+            trace_media_exports.labels(result="sampled_out").inc()
+            return False
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(export)
+        except queue.Full:
+            trace_media_exports.labels(result="dropped").inc()
+            logger.warning(f"Trace media queue is full, dropping export for session {export.session_id}")
+            return False
+        return True
+
+    def flush(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            # Threads do not survive a fork, so each worker process starts its own with a fresh queue
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._run, name="trace-media-export", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            export = self._queue.get()
+            try:
+                self._export(export)
+                trace_media_exports.labels(result="exported").inc()
+            except Exception as error:
+                trace_media_exports.labels(result="failed").inc()
+                logger.error(f"Failed to export trace media for session {export.session_id}: {error}")
+            finally:
+                self._queue.task_done()
+
+    def _export(self, export: MediaExport) -> None:
+        get_client().create_event(
+            trace_context={"trace_id": export.trace_id, "parent_span_id": export.parent_observation_id}
+            if export.parent_observation_id
+            else {"trace_id": export.trace_id},
+            name="card_image",
+            output=self._build_output(export),
+            metadata={"mediaMode": self.mode, "sessionId": export.session_id},
+        )
+
+    def _build_output(self, export: MediaExport) -> dict:
+        if self.mode == "s3_reference":
+            return {"s3Bucket": settings.s3_bucket_name, "s3Key": export.object_key}
+
+        if self.mode == "thumbnail":
+            with Image.open(BytesIO(base64.b64decode(export.image_base64))) as image:
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                buffer = BytesIO()
+                image.convert("RGB").save(buffer, format="JPEG", quality=80)
+            return {"image": LangfuseMedia(content_bytes=buffer.getvalue(), content_type="image/jpeg")}
+
+        return {"image": LangfuseMedia(base64_data_uri=f"data:image/png;base64,{export.image_base64}")}
+
+
+@lru_cache
+def get_trace_media_exporter() -> TraceMediaExporter:
+    return TraceMediaExporter(
+        mode=settings.langfuse_media_mode,
+        sample_rate=settings.langfuse_media_sample_rate,
+        max_queue_size=settings.langfuse_media_queue_size,
+        thumbnail_size=settings.langfuse_media_thumbnail_size,
+    )
+
+
+def export_card_media(export: MediaExport) -> None:
+    if settings.enable_langfuse:
+        get_trace_media_exporter().submit(export)
+
+
+def flush_trace_exports(timeout: float = 5.0) -> None:
+    if settings.enable_langfuse:
+        get_trace_media_exporter().flush(timeout)
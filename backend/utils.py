@@ -1,36 +1,45 @@
 import base64
 import os
+from functools import lru_cache
 from io import BytesIO
+from typing import BinaryIO
 
-from llama_index.core.prompts import PromptTemplate
 from PIL import Image, ImageDraw, ImageFont
 from pillow_heif import register_heif_opener
-from pydantic import BaseModel, Field
 
 from .config import settings
 from .exceptions import ImageFormatError
-from .llms import llm
 from .logging_config import log_memory_usage, logger
+from .metrics import stage_duration
 
 register_heif_opener()
 
 
-class ValidationOutput(BaseModel):
-    is_valid: bool = Field(..., description="Whether the input is valid and appropriate")
-    reason: str = Field(..., description="Brief explanation of why it's valid or invalid")
+def _as_file(image_data: bytes | BinaryIO) -> BinaryIO:
+    """A rewound file for ``image_data``, so spooled uploads are decoded without reading them into memory first."""
+    if isinstance(image_data, bytes):
+        return BytesIO(image_data)
 
+    image_data.seek(0)
+    return image_data
 
-def validate_image_format(image_data: bytes) -> None:
+
+def _byte_size(image_file: BinaryIO) -> int:
+    size = image_file.seek(0, os.SEEK_END)
+    image_file.seek(0)
+    return size
+
+
+def validate_image_format(image_data: bytes | BinaryIO) -> None:
     try:
-        logger.debug(f"Validating image data of size: {len(image_data)} bytes")
+        image_file = _as_file(image_data)
+        size = _byte_size(image_file)
+        logger.debug(f"Validating image data of size: {size} bytes")
 
-        if not image_data:
+        if not size:
             raise ImageFormatError("Image data is empty")
 
-        image_buffer = BytesIO(image_data)
-        image_buffer.seek(0)
-
-        with Image.open(image_buffer) as image:
+        with Image.open(image_file) as image:
             image_format = image.format
             image.verify()
             logger.debug(f"Image format validated: {image_format}")
@@ -41,9 +50,11 @@ def validate_image_format(image_data: bytes) -> None:
         raise ImageFormatError("Unable to process image. Please upload a valid image file (PNG, JPG, HEIC, WebP, etc.)")
 
 
-def compress_image(image_data: bytes, max_size_bytes: int = 1024 * 1024) -> bytes:
+def compress_image(image_data: bytes | BinaryIO, max_size_bytes: int = 1024 * 1024) -> bytes:
     log_memory_usage("Before image compression")
-    with Image.open(BytesIO(image_data)) as image:
+    image_file = _as_file(image_data)
+    original_bytes = _byte_size(image_file)
+    with Image.open(image_file) as image:
         original_size = image.size
 
         if image.mode != "RGB":
@@ -53,9 +64,7 @@ def compress_image(image_data: bytes, max_size_bytes: int = 1024 * 1024) -> byte
         image.save(buffer, format="JPEG", quality=85, optimize=False)  # Skip optimize for speed
 
         if buffer.tell() <= max_size_bytes:
-            logger.info(
-                f"Image compressed to {buffer.tell() / 1024:.0f} KB (original: {len(image_data) / 1024:.0f} KB)"
-            )
+            logger.info(f"Image compressed to {buffer.tell() / 1024:.0f} KB (original: {original_bytes / 1024:.0f} KB)")
             return buffer.getvalue()
 
         size_ratio = buffer.tell() / max_size_bytes
@@ -70,7 +79,7 @@ def compress_image(image_data: bytes, max_size_bytes: int = 1024 * 1024) -> byte
                 if buffer.tell() <= max_size_bytes:
                     logger.info(
                         f"Resized from {original_size} to {new_size}, "
-                        f"compressed to {buffer.tell() / 1024:.0f} KB (original: {len(image_data) / 1024:.0f} KB)"
+                        f"compressed to {buffer.tell() / 1024:.0f} KB (original: {original_bytes / 1024:.0f} KB)"
                     )
                     return buffer.getvalue()
 
@@ -92,19 +101,33 @@ def compress_image(image_data: bytes, max_size_bytes: int = 1024 * 1024) -> byte
         return buffer.getvalue()
 
 
-async def validate_input(query: str, prompt: PromptTemplate) -> bool:
-    logger.debug(f"Validating input: {query[:100]}...")
-    validation_result = await llm.astructured_predict(
-        output_cls=ValidationOutput,
-        prompt=prompt,
-        query=query,
-    )
+ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@lru_cache(maxsize=1)
+def card_font() -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    font_path = os.path.join(ASSETS_DIR, "fonts", "Pacifico-Regular.ttf")
+    try:
+        return ImageFont.truetype(font_path, settings.card_font_size)
+    except Exception as e:
+        logger.warning(f"Warning: Could not load Pacifico font from {font_path}: {e}")
+        logger.warning("Falling back to default font")
+        return ImageFont.load_default(size=settings.card_font_size)
 
-    logger.debug(f"Validation result: {validation_result.is_valid} - {validation_result.reason}")
 
-    return validation_result.is_valid
+@lru_cache(maxsize=1)
+def branding_logo() -> Image.Image:
+    """The logo resized for the branding area at half opacity. Shared between cards, so never draw on it."""
+    with Image.open(os.path.join(ASSETS_DIR, "assets", "fastruby-logo.png")) as logo:
+        width = int(settings.card_branding_logo_height * logo.width / logo.height)
+        resized_logo = logo.resize((width, settings.card_branding_logo_height), Image.Resampling.BILINEAR)
 
+    resized_logo = resized_logo.convert("RGBA")
+    resized_logo.putalpha(resized_logo.getchannel("A").point(lambda alpha: alpha // 2))
+    return resized_logo
 
+
+@stage_duration.labels(stage="create_card").time()
 def create_card(image_base64: str, text: str) -> str:
     log_memory_usage("Before card creation")
     image_data = base64.b64decode(image_base64)
@@ -124,16 +147,7 @@ def create_card(image_base64: str, text: str) -> str:
             card.paste(generated_image, (img_x, img_y))
 
             draw = ImageDraw.Draw(card)
-
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            font_path = os.path.join(current_dir, "fonts", "Pacifico-Regular.ttf")
-
-            try:
-                font = ImageFont.truetype(font_path, settings.card_font_size)
-            except Exception as e:
-                logger.warning(f"Warning: Could not load Pacifico font from {font_path}: {e}")
-                logger.warning("Falling back to default font")
-                font = ImageFont.load_default(size=settings.card_font_size)
+            font = card_font()
 
             bbox = draw.textbbox((0, 0), text, font=font)
             text_width = bbox[2] - bbox[0]
@@ -146,29 +160,11 @@ def create_card(image_base64: str, text: str) -> str:
 
             draw.text((text_x, title_y), text, fill="#000000", font=font)
 
-            logo_path = os.path.join(current_dir, "assets", "fastruby-logo.png")
             try:
-                with Image.open(logo_path) as logo:
-                    aspect_ratio = logo.width / logo.height
-                    new_logo_width = int(settings.card_branding_logo_height * aspect_ratio)
-                    with logo.resize(
-                        (new_logo_width, settings.card_branding_logo_height), Image.Resampling.BILINEAR
-                    ) as resized_logo:
-                        if resized_logo.mode != "RGBA":
-                            resized_logo = resized_logo.convert("RGBA")
-                        logo_data = resized_logo.getdata()
-                        new_logo_data = []
-                        for item in logo_data:
-                            new_logo_data.append((item[0], item[1], item[2], int(item[3] * 0.5)))
-                        resized_logo.putdata(new_logo_data)
-
-                        branding_area_start = settings.card_border_size
-
-                        logo_x = (card_width - new_logo_width) // 2
-                        logo_y = branding_area_start + settings.card_branding_padding_top
-
-                        card.paste(resized_logo, (logo_x, logo_y), resized_logo)
-
+                logo = branding_logo()
+                logo_x = (card_width - logo.width) // 2
+                logo_y = settings.card_border_size + settings.card_branding_padding_top
+                card.paste(logo, (logo_x, logo_y), logo)
             except Exception as e:
                 logger.warning(f"Could not add branding to card: {e}")
 
@@ -0,0 +1,50 @@
+"""LLM validation of user input, shared by the card workflows.
+
+Kept apart from the image helpers in ``utils`` so the web process can use those without importing the LLM stack.
+"""
+
+from functools import partial
+
+from llama_index.core.prompts import PromptTemplate
+from pydantic import BaseModel, Field
+
+from .cache import get_validation_cache
+from .concurrency import limited
+from .llms import llm
+from .logging_config import logger
+from .metrics import stage_duration
+from .prefilter import PrefilterRules, Verdict, prefilter
+
+
+class ValidationOutput(BaseModel):
+    is_valid: bool = Field(..., description="Whether the input is valid and appropriate")
+    reason: str = Field(..., description="Brief explanation of why it's valid or invalid")
+
+
+async def validate_input(query: str, prompt: PromptTemplate, rules: PrefilterRules | None = None) -> bool:
+    logger.debug(f"Validating input: {query[:100]}...")
+
+    if rules:
+        verdict = prefilter(query, rules)
+        if verdict != Verdict.AMBIGUOUS:
+            logger.debug(f"Input settled by local pre-filter: {verdict}")
+            return verdict == Verdict.ACCEPT
+
+    validation_cache = get_validation_cache()
+    if validation_cache:
+        cached_is_valid = await validation_cache.get(query, prompt)
+        if cached_is_valid is not None:
+            logger.debug(f"Validation cache hit: {cached_is_valid}")
+            return cached_is_valid
+
+    with stage_duration.labels(stage="validation_llm").time():
+        validation_result = await limited(
+            "llm", partial(llm.astructured_predict, output_cls=ValidationOutput, prompt=prompt, query=query)
+        )
+
+    logger.debug(f"Validation result: {validation_result.is_valid} - {validation_result.reason}")
+
+    if validation_cache:
+        await validation_cache.set(query, prompt, validation_result.is_valid)
+
+    return validation_result.is_valid
@@ -1,11 +1,9 @@
-import json
 import random
+import time
 from contextlib import nullcontext
-from io import BytesIO
 from textwrap import dedent
 
 from langfuse import get_client
-from langfuse.media import LangfuseMedia
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.workflow import (
     Context,
@@ -19,9 +17,14 @@ from llama_index.core.workflow import (
 from .config import settings
 from .dependencies import get_redis_pubsub_client
 from .exceptions import InputValidationError
-from .llms import openai_client
+from .image_providers import get_image_provider
 from .logging_config import log_memory_usage, logger
-from .utils import create_card, validate_input
+from .metrics import stage_duration
+from .prefilter import HOLIDAY_RULES
+from .profiling import current_profile_summary
+from .streaming import publish_event
+from .utils import create_card
+from .validation import validate_input
 
 HOLIDAY_THEMES = [
     "Champagne Toast",
@@ -121,6 +124,14 @@ image_prompt = dedent(
 )
 
 
+class ValidateInputEvent(Event):
+    pass
+
+
+class PickThemeEvent(Event):
+    pass
+
+
 class ValidatedInputEvent(Event):
     is_valid: bool
 
@@ -135,30 +146,49 @@ class GeneratedImageEvent(Event):
 
 
 class HolidayImageGenWorkflow(Workflow):
+    """Generates a New Year card.
+
+    With ``speculative_image_generation`` on, the image edit starts alongside validation. Partial images are only
+    published once the message is valid, and failing validation cancels the image edit.
+    """
+
     @step()
-    async def validate_input(self, ev: StartEvent, ctx: Context) -> ValidatedInputEvent:
+    async def start(self, ev: StartEvent, ctx: Context) -> ValidateInputEvent | PickThemeEvent | None:
         image_data = ev.get("image_data")
         if not image_data:
             raise ValueError("An uploaded image is required.")
 
-        message = ev.get("message", "")
-        session_id = ev.get("session_id")
-
         await ctx.store.set("image_data", image_data)
-        await ctx.store.set("message", message)
-        await ctx.store.set("session_id", session_id)
+        await ctx.store.set("message", ev.get("message", ""))
+        await ctx.store.set("session_id", ev.get("session_id"))
+
+        ctx.send_event(ValidateInputEvent())
+        if settings.speculative_image_generation:
+            ctx.send_event(PickThemeEvent())
 
-        is_valid = await validate_input(query=message, prompt=validation_prompt)
+        return None
+
+    @step()
+    async def validate_input(
+        self,
+        ev: ValidateInputEvent,  # noqa: ARG002
+        ctx: Context,
+    ) -> ValidatedInputEvent | PickThemeEvent:
+        message = await ctx.store.get("message", "")
+
+        is_valid = await validate_input(query=message, prompt=validation_prompt, rules=HOLIDAY_RULES)
 
         if not is_valid:
-            raise InputValidationError(
-                "Sorry, we cannot generate a card with that message. Please enter an appropriate message"
-            )
+            raise InputValidationError(HOLIDAY_RULES.invalid_message)
+
+        await ctx.store.set("is_valid", is_valid)
+        if not settings.speculative_image_generation:
+            ctx.send_event(PickThemeEvent())
 
         return ValidatedInputEvent(is_valid=is_valid)
 
     @step()
-    async def pick_theme(self, ev: ValidatedInputEvent) -> HolidayThemeEvent:  # noqa: ARG002
+    async def pick_theme(self, ev: PickThemeEvent) -> HolidayThemeEvent:  # noqa: ARG002
         theme = random.choice(HOLIDAY_THEMES)  # noqa: S311
         logger.debug(f"Holiday theme: {theme}")
 
@@ -170,20 +200,17 @@ class HolidayImageGenWorkflow(Workflow):
         session_id = await ctx.store.get("session_id")
         message = await ctx.store.get("message", "")
 
-        image_file = BytesIO(image_data)
-        image_file.name = settings.mock_upload_file_name
-
         prompt = image_prompt.format(theme=ev.theme)
 
+        image_provider = get_image_provider()
         redis_client = get_redis_pubsub_client()
-        channel = f"image_stream:{session_id}"
 
         if settings.enable_langfuse:
             langfuse = get_client()
             observation_context = langfuse.start_as_current_observation(
                 as_type="generation",
-                name="openai.images.edit",
-                model=settings.image_gen_model,
+                name=f"{image_provider.name}.images.edit",
+                model=image_provider.model,
                 input={
                     "prompt": prompt,
                     "size": settings.generated_image_size,
@@ -195,54 +222,49 @@ class HolidayImageGenWorkflow(Workflow):
         log_memory_usage("Before OpenAI image generation")
 
         with observation_context as obs:
-            stream = openai_client.images.edit(
-                image=image_file,
-                prompt=prompt,
-                model=settings.image_gen_model,
-                n=1,
-                size=settings.generated_image_size,
-                stream=True,
-                partial_images=3,
-            )
+            image_started_at = time.perf_counter()
+            stream = image_provider.edit(image_data=image_data, prompt=prompt)
 
             generated_image_base64 = None
             partial_count = 0
-
-            for event in stream:
-                logger.debug(f"Received event type: {event.type} for session {session_id}")
-
-                if event.type == "image_generation.partial_image" or event.type == "image_edit.partial_image":
-                    partial_count += 1
-                    partial_image_base64 = event.b64_json
-                    logger.debug(f"Received partial image {partial_count} for session {session_id}")
-
-                    partial_card_base64 = create_card(image_base64=partial_image_base64, text=message)
-
-                    redis_client.publish(
-                        channel,
-                        json.dumps(
-                            {
-                                "type": "partial",
-                                "image_base64": partial_card_base64,
-                                "partial_index": partial_count,
-                            }
-                        ),
-                    )
-
-                elif event.type == "image_generation.completed" or event.type == "image_edit.completed":
-                    generated_image_base64 = event.b64_json
-                    logger.debug(f"Received final image for session {session_id}")
-                else:
-                    logger.warning(f"Unknown event type: {event.type}")
+            pending_partial_base64 = None
+
+            try:
+                async for image in stream:
+                    if image.is_final:
+                        generated_image_base64 = image.image_base64
+                        logger.debug("Received final image for session %s", session_id)
+                    else:
+                        partial_count += 1
+                        pending_partial_base64 = image.image_base64
+                        if partial_count == 1:
+                            stage_duration.labels(stage="image_first_partial").observe(
+                                time.perf_counter() - image_started_at
+                            )
+                        logger.debug("Received partial image %d for session %s", partial_count, session_id)
+
+                    # Hold partials back until the message is validated; only the latest one is worth showing
+                    if pending_partial_base64 and await ctx.store.get("is_valid", default=False):
+                        partial_card_base64 = create_card(image_base64=pending_partial_base64, text=message)
+                        pending_partial_base64 = None
+
+                        publish_event(
+                            redis_client,
+                            session_id,
+                            {"type": "partial", "partial_index": partial_count},
+                            image_base64=partial_card_base64,
+                        )
+                stage_duration.labels(stage="image_total").observe(time.perf_counter() - image_started_at)
+            finally:
+                await stream.aclose()
+                redis_client.close()
 
             if settings.enable_langfuse:
-                image_media = LangfuseMedia(base64_data_uri=f"data:image/png;base64,{generated_image_base64}")
                 total_cost = settings.price_per_image
 
                 obs.update(
                     output={
                         "holiday_theme": ev.theme,
-                        "image": image_media,
                     },
                     usage_details={"images": 1},
                     cost_details={"images": float(total_cost)},
@@ -250,34 +272,30 @@ class HolidayImageGenWorkflow(Workflow):
                         "costUsd": total_cost,
                         "generatedImageSize": settings.generated_image_size,
                         "partialImagesReceived": partial_count,
+                        "profile": current_profile_summary(),
                     },
                 )
 
-        redis_client.close()
         log_memory_usage("After OpenAI image generation")
         logger.debug("Holiday card generated.")
 
         return GeneratedImageEvent(image_base64=generated_image_base64, theme=ev.theme)
 
     @step()
-    async def generate_card(self, ev: GeneratedImageEvent, ctx: Context) -> StopEvent:
+    async def generate_card(self, ev: ValidatedInputEvent | GeneratedImageEvent, ctx: Context) -> StopEvent | None:
+        collected_events = ctx.collect_events(ev, [ValidatedInputEvent, GeneratedImageEvent])
+        if collected_events is None:
+            return None
+
+        _, image_event = collected_events
         message = await ctx.store.get("message", "")
         session_id = await ctx.store.get("session_id")
 
-        logger.debug(f"Creating holiday card with theme: {ev.theme}")
-        final_card_base64 = create_card(image_base64=ev.image_base64, text=message)
+        logger.debug(f"Creating holiday card with theme: {image_event.theme}")
+        final_card_base64 = create_card(image_base64=image_event.image_base64, text=message)
 
         redis_client = get_redis_pubsub_client()
-        channel = f"image_stream:{session_id}"
-        redis_client.publish(
-            channel,
-            json.dumps(
-                {
-                    "type": "complete",
-                    "image_base64": final_card_base64,
-                }
-            ),
-        )
+        publish_event(redis_client, session_id, {"type": "complete"}, image_base64=final_card_base64)
         redis_client.close()
 
         return StopEvent(
@@ -0,0 +1,32 @@
+// Writes .br and .gz copies of the compressible build output for the backend to serve
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { join } from 'node:path'
+import { brotliCompressSync, constants, gzipSync } from 'node:zlib'
+
+const distDir = new URL('../dist/', import.meta.url).pathname
+const compressible = /\.(html|js|mjs|css|json|svg|txt|xml|map|ico|webmanifest)$/
+const minSize = 1024
+
+const walk = (dir) =>
+  readdirSync(dir).flatMap((name) => {
+    const path = join(dir, name)
+    return statSync(path).isDirectory() ? walk(path) : [path]
+  })
+
+for (const path of walk(distDir)) {
+  if (!compressible.test(path)) continue
+
+  const content = readFileSync(path)
+  if (content.length < minSize) continue
+
+  writeFileSync(
+    `${path}.br`,
+    brotliCompressSync(content, {
+      params: {
+        [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+        [constants.BROTLI_PARAM_SIZE_HINT]: content.length,
+      },
+    })
+  )
+  writeFileSync(`${path}.gz`, gzipSync(content, { level: 9 }))
+}
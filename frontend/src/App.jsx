@@ -22,6 +22,15 @@ function App() {
   const [holidayTheme, setHolidayTheme] = useState(false)
   const [holidayMessage, setHolidayMessage] = useState('')
 
+  // Images streamed over the WebSocket are blob URLs; revoke each one once it is replaced
+  const replaceImage = (setImage) => (imageUrl) =>
+    setImage((previous) => {
+      if (previous?.startsWith('blob:') && previous !== imageUrl) URL.revokeObjectURL(previous)
+      return imageUrl
+    })
+  const showGeneratedImage = replaceImage(setGeneratedImage)
+  const showPartialImage = replaceImage(setPartialImage)
+
   const handleImageUpload = async (event) => {
     const file = event.target.files[0]
     if (!file) return
@@ -95,16 +104,16 @@ function App() {
         const data = JSON.parse(event.data)
 
         if (data.type === 'partial') {
-          setPartialImage(`data:image/png;base64,${data.image_base64}`)
+          showPartialImage(`data:image/png;base64,${data.image_base64}`)
           setPartialIndex(data.partial_index)
         } else if (data.type === 'complete') {
-          setGeneratedImage(`data:image/png;base64,${data.image_base64}`)
-          setPartialImage(null)
+          showGeneratedImage(`data:image/png;base64,${data.image_base64}`)
+          showPartialImage(null)
           setLoading(false)
           eventSource.close()
         } else if (data.type === 'error') {
           setError(data.message || 'Failed to generate card. Please try again.')
-          setPartialImage(null)
+          showPartialImage(null)
           setLoading(false)
           eventSource.close()
         }
@@ -116,7 +125,7 @@ function App() {
     eventSource.onerror = (err) => {
       console.error('SSE connection error:', err, 'ReadyState:', eventSource.readyState)
       setError('Connection error. Please try again.')
-      setPartialImage(null)
+      showPartialImage(null)
       setLoading(false)
       eventSource.close()
     }
@@ -124,6 +133,65 @@ function App() {
     return () => eventSource.close()
   }
 
+  // Same events as the SSE stream, but each card image arrives as a binary PNG frame right after its event
+  const connectToSocket = (sessionId, apiUrl) => {
+    const url = new URL(`${apiUrl}/ws/${sessionId}`, window.location.href)
+    url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:'
+
+    const socket = new WebSocket(url)
+    let opened = false
+    let finished = false
+    let imageEvent = null
+
+    const fail = (message) => {
+      finished = true
+      setError(message)
+      showPartialImage(null)
+      setLoading(false)
+      socket.close()
+    }
+
+    socket.onopen = () => {
+      opened = true
+    }
+
+    socket.onmessage = (message) => {
+      if (typeof message.data !== 'string') {
+        const imageUrl = URL.createObjectURL(message.data)
+        if (imageEvent?.type === 'partial') {
+          showPartialImage(imageUrl)
+          setPartialIndex(imageEvent.partial_index)
+        } else if (imageEvent?.type === 'complete') {
+          finished = true
+          showGeneratedImage(imageUrl)
+          showPartialImage(null)
+          setLoading(false)
+        }
+        imageEvent = null
+        return
+      }
+
+      const data = JSON.parse(message.data)
+      if (data.type === 'partial' || data.type === 'complete') {
+        imageEvent = data
+      } else if (data.type === 'error') {
+        fail(data.message || 'Failed to generate card. Please try again.')
+      }
+    }
+
+    socket.onclose = () => {
+      if (finished) return
+      if (!opened) {
+        // WebSockets can be blocked by proxies, so fall back to SSE
+        connectToStream(sessionId, apiUrl)
+        return
+      }
+      fail('Connection error. Please try again.')
+    }
+
+    return () => socket.close()
+  }
+
   const handleGenerate = async () => {
     if (holidayTheme) {
       if (!holidayMessage || !imageFile) {
@@ -157,9 +225,13 @@ function App() {
       })
 
       if (response.status === 202) {
-        connectToStream(sessionId, apiUrl)
+        if ('WebSocket' in window) {
+          connectToSocket(sessionId, apiUrl)
+        } else {
+          connectToStream(sessionId, apiUrl)
+        }
       } else {
-        setGeneratedImage(`data:image/png;base64,${response.data.image_base64}`)
+        showGeneratedImage(`data:image/png;base64,${response.data.image_base64}`)
         setLoading(false)
       }
     } catch (err) {
@@ -167,7 +239,7 @@ function App() {
         err.response?.data?.error ||
         'Uh oh. Something went wrong... Please try again or contact us.'
       setError(errorMessage)
-      setPartialImage(null)
+      showPartialImage(null)
       setLoading(false)
     }
   }
@@ -196,8 +268,8 @@ function App() {
   }
 
   const handleRegenerate = () => {
-    setGeneratedImage(null)
-    setPartialImage(null)
+    showGeneratedImage(null)
+    showPartialImage(null)
     setPartialIndex(0)
     setSkills('')
     setHolidayTheme(false)